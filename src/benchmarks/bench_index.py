@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Time the per-day event lookup of the summary loop for growing histories
+
+Run from the src folder with: python -m benchmarks.bench_index
+"""
+
+import datetime
+import time
+
+from utils import event_utils
+from utils.event import from_api_items
+
+
+def synthetic_events(days, per_day=3):
+    first = datetime.datetime(2000, 1, 3, 8, tzinfo=datetime.timezone.utc)
+    events = []
+    for day in range(days):
+        for slot in range(per_day):
+            start = first + datetime.timedelta(days=day, hours=3 * slot)
+            end = start + datetime.timedelta(hours=2)
+            events.append(
+                {
+                    "summary": "WORK",
+                    "start": {"dateTime": start.isoformat(), "timeZone": "UTC"},
+                    "end": {"dateTime": end.isoformat(), "timeZone": "UTC"},
+                }
+            )
+    return from_api_items(events)
+
+
+def day_loop_indexed(events, days):
+    first = events[0].start.date()
+    events_by_date = event_utils.index_by_date(events)
+    count = 0
+    for i in range(days):
+        count += len(events_by_date.get(first + datetime.timedelta(days=i), []))
+    return count
+
+
+def day_loop_scan(events, days):
+    first = events[0].start.date()
+    count = 0
+    for i in range(days):
+        date = first + datetime.timedelta(days=i)
+        count += len([event for event in events if event.start.date() == date])
+    return count
+
+
+def measure(loop, events, days):
+    start = time.perf_counter()
+    loop(events, days)
+    return time.perf_counter() - start
+
+
+def main():
+    print(
+        "{:>6} {:>8} {:>12} {:>14}".format("years", "events", "indexed [s]", "us/event")
+    )
+    for years in (1, 2, 5, 10, 20):
+        days = 365 * years
+        events = synthetic_events(days)
+        elapsed = measure(day_loop_indexed, events, days)
+        print(
+            "{:>6} {:>8} {:>12.4f} {:>14.2f}".format(
+                years, len(events), elapsed, 1e6 * elapsed / len(events)
+            )
+        )
+
+    print("\nPer-day scan, for comparison")
+    for years in (1, 2):
+        days = 365 * years
+        events = synthetic_events(days)
+        elapsed = measure(day_loop_scan, events, days)
+        print("{:>6} {:>8} {:>12.4f}".format(years, len(events), elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Measure the startup time of main.py against a budget
+
+Run from the src folder with: python -m benchmarks.bench_startup
+Exits with status 1 when a median is over its budget.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 10
+
+# Median wall time budgets in seconds
+BUDGETS = {
+    "import main": 0.15,
+    "main.py --help": 0.2,
+}
+
+COMMANDS = {
+    "import main": [sys.executable, "-c", "import main"],
+    "main.py --help": [sys.executable, "main.py", "--help"],
+}
+
+
+def measure(command):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def slowest_imports(count=10):
+    """Return the modules with the largest cumulative import time"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        check=True,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, module = line.split("|")
+        imports.append((int(cumulative), module.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Baseline for the interpreter itself
+    print("{:<16} {:.3f} s".format("python", measure([sys.executable, "-c", "pass"])))
+    over_budget = False
+    for name, command in COMMANDS.items():
+        median = measure(command)
+        status = "ok" if median <= BUDGETS[name] else "OVER BUDGET"
+        over_budget = over_budget or median > BUDGETS[name]
+        print(
+            "{:<16} {:.3f} s (budget {:.3f} s) {}".format(
+                name, median, BUDGETS[name], status
+            )
+        )
+
+    print("\nSlowest imports [us]")
+    for cumulative, module in slowest_imports():
+        print("{:>10} {}".format(cumulative, module))
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
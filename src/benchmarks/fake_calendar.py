@@ -0,0 +1,292 @@
+"""In-process fake of the parts of the Calendar API service used by wlog
+
+It supports paging, time windows, ordering, sync tokens, batches and
+event mutations, and counts the requests and bytes it serves.
+"""
+
+import collections
+import copy
+import datetime
+import json
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from utils.event import parse_time
+
+DEFAULT_PAGE_SIZE = 250
+MAX_PAGE_SIZE = 2500
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"")
+
+
+def _project(response, fields):
+    """Keep the parts of response named by a partial response fields value"""
+    if fields is None or not isinstance(response, dict):
+        return response
+    projected = {}
+    depth = 0
+    name = ""
+    nested = ""
+    for char in fields + ",":
+        if char == "(":
+            depth += 1
+            if depth == 1:
+                continue
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                continue
+        if depth:
+            nested += char
+        elif char == ",":
+            if name in response:
+                value = response[name]
+                if nested and isinstance(value, list):
+                    value = [_project(item, nested) for item in value]
+                elif nested:
+                    value = _project(value, nested)
+                projected[name] = value
+            name = nested = ""
+        else:
+            name += char
+    return projected
+
+
+def _parse_rfc3339(value):
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class FakeRequest:
+    def __init__(self, service, method, run, fields=None):
+        self.service = service
+        self.method = method
+        self.run = run
+        self.fields = fields
+        self.headers = {}
+
+    def execute(self, http=None, num_retries=0):
+        self.service.requests[self.method] += 1
+        return self._respond()
+
+    def _respond(self):
+        response = _project(self.run(self.headers), self.fields)
+        self.service.bytes += len(json.dumps(response))
+        return copy.deepcopy(response)
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None, callback=None):
+        if len(self.requests) >= 1000:
+            raise ValueError("Too many requests in batch")
+        self.requests.append((request_id or str(len(self.requests)), request))
+
+    def execute(self, http=None):
+        self.service.requests["batch"] += 1
+        for request_id, request in self.requests:
+            self.service.requests[request.method + " (batched)"] += 1
+            try:
+                response = request._respond()
+            except HttpError as error:
+                self.callback(request_id, None, error)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeCalendarList:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, pageToken=None, maxResults=100, **kwargs):
+        def run(headers):
+            offset = int(pageToken or 0)
+            calendars = self.service.calendars
+            response = {"items": calendars[offset : offset + maxResults]}
+            if offset + maxResults < len(calendars):
+                response["nextPageToken"] = str(offset + maxResults)
+            return response
+
+        return FakeRequest(self.service, "calendarList.list", run)
+
+
+class FakeEvents:
+    def __init__(self, service):
+        self.service = service
+
+    def _calendar(self, calendarId):
+        try:
+            return self.service.events_by_calendar[calendarId]
+        except KeyError:
+            raise http_error(404)
+
+    def list(
+        self,
+        calendarId,
+        pageToken=None,
+        syncToken=None,
+        timeMin=None,
+        timeMax=None,
+        orderBy=None,
+        singleEvents=False,
+        maxResults=DEFAULT_PAGE_SIZE,
+        showDeleted=False,
+        updatedMin=None,
+        fields=None,
+        **kwargs
+    ):
+        def run(headers):
+            calendar = self._calendar(calendarId)
+            if syncToken is not None:
+                if syncToken in self.service.expired_tokens:
+                    raise http_error(410)
+                if timeMin or timeMax or orderBy:
+                    raise http_error(400)
+                since = int(syncToken)
+                items = [
+                    e
+                    for e in calendar.values()
+                    if self.service.modified[e["id"]] > since
+                ]
+            elif updatedMin is not None:
+                # Deleted events are always included with updatedMin
+                updated_min = _parse_rfc3339(updatedMin)
+                items = [
+                    e
+                    for e in calendar.values()
+                    if _parse_rfc3339(e["updated"]) >= updated_min
+                ]
+            else:
+                items = [
+                    e
+                    for e in calendar.values()
+                    if showDeleted or e.get("status") != "cancelled"
+                ]
+            if timeMin is not None:
+                time_min = _parse_rfc3339(timeMin)
+                items = [e for e in items if parse_time(e["end"]) > time_min]
+            if timeMax is not None:
+                time_max = _parse_rfc3339(timeMax)
+                items = [e for e in items if parse_time(e["start"]) < time_max]
+            if orderBy == "startTime":
+                items.sort(key=lambda e: parse_time(e["start"]))
+
+            page_size = min(maxResults, MAX_PAGE_SIZE)
+            offset = int(pageToken or 0)
+            response = {"items": items[offset : offset + page_size]}
+            if offset + page_size < len(items):
+                response["nextPageToken"] = str(offset + page_size)
+            elif not (timeMin or timeMax or orderBy or updatedMin):
+                response["nextSyncToken"] = str(self.service.sequence)
+            return response
+
+        return FakeRequest(self.service, "events.list", run, fields)
+
+    def get(self, calendarId, eventId, fields=None, **kwargs):
+        def run(headers):
+            event = self._calendar(calendarId).get(eventId)
+            if event is None:
+                raise http_error(404)
+            if headers.get("If-None-Match") == event.get("etag"):
+                raise http_error(304)
+            return event
+
+        return FakeRequest(self.service, "events.get", run, fields)
+
+    def insert(self, calendarId, body, **kwargs):
+        def run(headers):
+            calendar = self._calendar(calendarId)
+            event = dict(body)
+            event.setdefault("id", "fake{:x}".format(self.service.sequence + 1))
+            if event["id"] in calendar:
+                raise http_error(409)
+            return self.service.store(calendarId, event)
+
+        return FakeRequest(self.service, "events.insert", run)
+
+    def update(self, calendarId, eventId, body, **kwargs):
+        def run(headers):
+            if eventId not in self._calendar(calendarId):
+                raise http_error(404)
+            return self.service.store(calendarId, dict(body, id=eventId))
+
+        return FakeRequest(self.service, "events.update", run)
+
+    def patch(self, calendarId, eventId, body, **kwargs):
+        def run(headers):
+            event = self._calendar(calendarId).get(eventId)
+            if event is None:
+                raise http_error(404)
+            # A deleted event is only brought back by its status
+            if event.get("status") == "cancelled" and "status" not in body:
+                raise http_error(404)
+            return self.service.store(calendarId, dict(event, **body))
+
+        return FakeRequest(self.service, "events.patch", run)
+
+    def delete(self, calendarId, eventId, **kwargs):
+        def run(headers):
+            event = self._calendar(calendarId).get(eventId)
+            if event is None or event.get("status") == "cancelled":
+                raise http_error(410)
+            self.service.store(calendarId, {"id": eventId, "status": "cancelled"})
+            return ""
+
+        return FakeRequest(self.service, "events.delete", run)
+
+
+class FakeService:
+    """Stand-in for the object returned by cal.authenticate"""
+
+    def __init__(self, calendars=None):
+        self.calendars = []
+        self.events_by_calendar = {}
+        self.modified = {}
+        self.sequence = 0
+        self.expired_tokens = set()
+        self.requests = collections.Counter()
+        self.bytes = 0
+        for name, events in (calendars or {}).items():
+            self.add_calendar(name, events)
+
+    def add_calendar(self, name, events=()):
+        calendar_id = "{}@group.calendar.google.com".format(
+            name.lower().replace(" ", "")
+        )
+        self.calendars.append({"id": calendar_id, "summary": name})
+        self.events_by_calendar[calendar_id] = {}
+        for event in events:
+            event = self.store(calendar_id, dict(event))
+            # The history was last edited when it happened
+            event["updated"] = parse_time(event["end"]).isoformat()
+        return calendar_id
+
+    def store(self, calendar_id, event):
+        self.sequence += 1
+        event["etag"] = '"{}"'.format(self.sequence)
+        event["updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.events_by_calendar[calendar_id][event["id"]] = event
+        self.modified[event["id"]] = self.sequence
+        return event
+
+    def expire_sync_tokens(self):
+        self.expired_tokens.update(str(i) for i in range(self.sequence + 1))
+
+    def reset_counters(self):
+        self.requests.clear()
+        self.bytes = 0
+
+    def events(self):
+        return FakeEvents(self)
+
+    def calendarList(self):
+        return FakeCalendarList(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""Time the commands end to end against a fake calendar of synthetic history
+
+Run from the src folder with: python -m benchmarks.run [--record | --check]
+
+--record stores the results in benchmarks/baseline.json, --check compares
+with it and exits with status 1 when a scenario makes more requests than
+the baseline or is slower than --tolerance times the baseline.
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import main
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import EXPECTED, generate_events
+from google_calendar import cache, cal
+from google_calendar.session import Session
+from utils import event_utils
+from utils.event import from_api_items
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+CALENDAR = "Work Hours"
+
+# Fixed so that the request counts of the baseline do not drift with time
+END_DATE = datetime.date(2025, 12, 31)
+
+
+def run_command(service, argv):
+    """Run a command and the day summary that main prints after it"""
+    args = main.build_parser().parse_args(argv)
+    session = Session(service, args.calendar, workers=args.parallel)
+    main.run_command(args, service, {"expected": EXPECTED}, session)
+
+
+def day_summary(service):
+    args = main.build_parser().parse_args(["list"])
+    main.WorkHours(service, {"expected": EXPECTED}, args).day_summary()
+
+
+def find_ongoing_events(service):
+    args = main.build_parser().parse_args(["stop"])
+    session = Session(service, args.calendar)
+    ongoing = main.find_ongoing_events(session, args)
+    session.close()
+    assert len(ongoing) == 1, ongoing
+
+
+def graph(events):
+    events_by_date = event_utils.index_by_date(from_api_items(events))
+    event_utils.graph_days(
+        events_by_date,
+        sorted(events_by_date),
+        start=datetime.time(0, 0, 0),
+        end=datetime.time(23, 59, 59),
+    )
+
+
+def scenarios(events):
+    """Yield (name, function of the service) in the order they are run
+
+    The first summary runs on an empty cache, the rest on a warm one.
+    """
+    yield "summary (cold)", lambda service: run_command(service, ["summary"])
+    yield "summary", lambda service: run_command(service, ["summary"])
+    yield "summary -d -w -m", lambda service: run_command(
+        service, ["summary", "-d", "-w", "-m"]
+    )
+    if importlib.util.find_spec("numpy") is not None:
+        yield "summary (numpy)", lambda service: run_command(
+            service, ["summary", "-d", "-w", "-m", "--engine", "numpy"]
+        )
+    yield "summary -d (jsonl)", lambda service: run_command(
+        service, ["summary", "-d", "--format", "jsonl"]
+    )
+    yield "list", lambda service: run_command(service, ["list"])
+    yield "list (csv)", lambda service: run_command(
+        service, ["list", "--format", "csv"]
+    )
+    yield "day_summary", day_summary
+    yield "find_ongoing_events", find_ongoing_events
+    yield "graph", lambda service: graph(events)
+
+
+def measure(years):
+    events = generate_events(years, end_date=END_DATE, seed=years)
+    service = FakeService({CALENDAR: events})
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+        cache, "CACHE_DIR", directory
+    ):
+        cal.invalidate_calendar_ids()
+        for name, scenario in scenarios(events):
+            service.reset_counters()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                scenario(service)
+                seconds = time.perf_counter() - start
+            results[name] = {
+                "seconds": round(seconds, 4),
+                "requests": sum(service.requests.values()),
+                "bytes": service.bytes,
+            }
+        cal.invalidate_calendar_ids()
+    return len(events), results
+
+
+def compare(baseline, results, tolerance):
+    """Return a description of each regression against the baseline"""
+    regressions = []
+    for key, scenarios in results.items():
+        for name, result in scenarios.items():
+            base = baseline.get(key, {}).get(name)
+            if base is None:
+                continue
+            if result["requests"] > base["requests"]:
+                regressions.append(
+                    "{} {}: {} requests, baseline {}".format(
+                        key, name, result["requests"], base["requests"]
+                    )
+                )
+            if result["seconds"] > tolerance * base["seconds"] + 0.01:
+                regressions.append(
+                    "{} {}: {:.3f} s, baseline {:.3f} s".format(
+                        key, name, result["seconds"], base["seconds"]
+                    )
+                )
+    return regressions
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-y", "--years", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--record", action="store_true", help="Write the baseline")
+    parser.add_argument("--check", action="store_true", help="Compare to baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    results = {}
+    print(
+        "{:>5} {:>7} {:<20} {:>9} {:>8} {:>10}".format(
+            "years", "events", "scenario", "seconds", "requests", "bytes"
+        )
+    )
+    for years in args.years:
+        count, scenarios = measure(years)
+        results["{} years".format(years)] = scenarios
+        for name, result in scenarios.items():
+            print(
+                "{:>5} {:>7} {:<20} {:>9.4f} {:>8} {:>10}".format(
+                    years,
+                    count,
+                    name,
+                    result["seconds"],
+                    result["requests"],
+                    result["bytes"],
+                )
+            )
+
+    if args.record:
+        with open(BASELINE, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+    if args.check:
+        with open(BASELINE, "r") as baseline_file:
+            regressions = compare(json.load(baseline_file), results, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main_benchmark()
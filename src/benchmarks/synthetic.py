@@ -0,0 +1,95 @@
+"""Generate realistic work hours calendars as API event resources"""
+
+import datetime
+import random
+
+UTC = datetime.timezone.utc
+CET = datetime.timezone(datetime.timedelta(hours=1))
+
+EXPECTED = [
+    {"startdate": "2000-01-01", "hours": [7.2, 7.2, 7.2, 7.2, 7.2, 0.0, 0.0]},
+]
+
+
+OWNER = {"email": "someone@example.com", "self": True}
+
+
+def _resource(event_id, **fields):
+    """Return an event with the fields the API sends besides ours"""
+    return dict(
+        kind="calendar#event",
+        id=event_id,
+        status="confirmed",
+        htmlLink="https://www.google.com/calendar/event?eid=" + event_id,
+        created="2019-01-01T00:00:00.000Z",
+        creator=OWNER,
+        organizer=OWNER,
+        iCalUID=event_id + "@google.com",
+        sequence=0,
+        reminders={"useDefault": False},
+        eventType="default",
+        **fields
+    )
+
+
+def _timed(event_id, summary, start, end, description=""):
+    return _resource(
+        event_id,
+        summary=summary,
+        description=description,
+        start={"dateTime": start.isoformat(), "timeZone": "UTC"},
+        end={"dateTime": end.isoformat(), "timeZone": "UTC"},
+    )
+
+
+def _all_day(event_id, summary, date):
+    return _resource(
+        event_id,
+        summary=summary,
+        start={"date": date.isoformat()},
+        end={"date": (date + datetime.timedelta(days=1)).isoformat()},
+    )
+
+
+def generate_events(years, end_date=None, seed=0):
+    """Return the events of years of work up to end_date
+
+    Weekdays have two to four WORK events and now and then a JOUR shift.
+    Each year has three weeks of VACATION, made of timed events, and a few
+    all-day NATIONAL HOLIDAY events. The last day ends with an ongoing,
+    zero duration event.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or datetime.date.today()
+    first_date = end_date - datetime.timedelta(days=int(365.25 * years))
+    events = []
+    date = first_date
+    vacation_left = 0
+    while date <= end_date:
+        event_id = "e{:x}".format(len(events))
+        if date.weekday() >= 5:
+            pass
+        elif (date.month, date.day) in ((1, 1), (5, 1), (6, 6), (12, 25)):
+            events.append(_all_day(event_id, "NATIONAL HOLIDAY", date))
+        elif vacation_left or (
+            date.month == 7 and date.weekday() == 0 and date.day < 8
+        ):
+            vacation_left = vacation_left - 1 if vacation_left else 14
+            start = datetime.datetime.combine(date, datetime.time(8), UTC)
+            end = start + datetime.timedelta(hours=8)
+            events.append(_timed(event_id, "VACATION", start, end))
+        else:
+            time = datetime.datetime.combine(date, datetime.time(7), CET)
+            time += datetime.timedelta(minutes=rng.randrange(0, 90, 5))
+            for part in range(rng.randint(2, 4)):
+                end = time + datetime.timedelta(minutes=rng.randrange(60, 240, 5))
+                summary = "JOUR" if rng.random() < 0.03 else "WORK"
+                events.append(
+                    _timed("{}p{}".format(event_id, part), summary, time, end)
+                )
+                time = end + datetime.timedelta(minutes=rng.randrange(15, 60, 5))
+        date += datetime.timedelta(days=1)
+
+    start = datetime.datetime.combine(end_date, datetime.time(16), UTC)
+    events.append(_timed("ongoing", "WORK", start, start))
+    return events
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""Keep wlog resident and answer its commands over a Unix socket
+
+Start the daemon with:   ./daemon.py --serve
+Then run commands with:  ./daemon.py start -d ...
+
+The daemon holds the authorized service, the calendar IDs and the loaded
+events of each calendar, and fetches the changes in the background. The
+client only forwards its arguments and prints the answer, and runs the
+command itself when no daemon is listening. Commands that ask a question
+must be run with -f through the daemon.
+"""
+
+import json
+import os
+import socket
+import sys
+
+SOCKET_NAME = "daemon.sock"
+
+# Seconds between two background fetches of the changes
+REFRESH_INTERVAL = 60
+
+
+def socket_path():
+    from google_calendar import cache
+
+    return os.environ.get("WLOG_SOCKET") or os.path.abspath(
+        cache.cache_path(SOCKET_NAME)
+    )
+
+
+def _receive(connection):
+    chunks = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode("utf-8"))
+
+
+def send(path, request):
+    """Send a request to the daemon at path and return its answer"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(json.dumps(request).encode("utf-8"))
+        connection.shutdown(socket.SHUT_WR)
+        return _receive(connection)
+
+
+class Daemon:
+    """Run commands on a warm service, one at a time"""
+
+    def __init__(self, service, config, path, refresh_interval=REFRESH_INTERVAL):
+        import threading
+
+        self.service = service
+        self.config = config
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def session(self, calendar, workers=None):
+        from google_calendar.session import Session
+
+        if calendar not in self.sessions:
+            self.sessions[calendar] = Session(self.service, calendar, workers)
+        return self.sessions[calendar]
+
+    def run(self, argv):
+        """Run a command line, return its exit status and output"""
+        import contextlib
+        import io
+        import traceback
+
+        import main
+        from google_calendar import cal
+
+        output = io.StringIO()
+        status = 0
+        stdin = sys.stdin
+        sys.stdin = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                args = main.build_parser().parse_args(argv)
+                if args.offline or args.record or args.replay:
+                    raise ValueError("--offline, --record and --replay need main.py")
+                if args.refresh_calendars:
+                    cal.invalidate_calendar_ids()
+                session = self.session(args.calendar, args.parallel)
+                main.run_command(args, self.service, self.config, session)
+        except SystemExit as error:
+            status = error.code if isinstance(error.code, int) else 1
+        except EOFError:
+            output.write("\nThe command asks a question, run it with -f\n")
+            status = 1
+        except Exception:
+            output.write(traceback.format_exc())
+            status = 1
+        finally:
+            sys.stdin = stdin
+        return status, output.getvalue()
+
+    def refresh(self):
+        """Fetch the changes of the loaded calendars until stopped"""
+        while not self.stopping.wait(self.refresh_interval):
+            with self.lock:
+                for name, session in self.sessions.items():
+                    try:
+                        session.refresh()
+                    except Exception as error:
+                        print("Refresh of {} failed: {}".format(name, error))
+
+    def handle(self, connection):
+        try:
+            request = _receive(connection)
+            stop = request.get("stop")
+            argv = None if stop else request["argv"]
+        except (ValueError, AttributeError, KeyError) as error:
+            answer = {"status": 2, "output": "Bad request: {!r}\n".format(error)}
+        else:
+            if stop:
+                self.stopping.set()
+                answer = {"status": 0, "output": "Daemon stopped\n"}
+            else:
+                with self.lock:
+                    status, output = self.run(argv)
+                answer = {"status": status, "output": output}
+        connection.sendall(json.dumps(answer).encode("utf-8"))
+
+    def serve(self, warm_calendar=None):
+        """Listen on the socket until a stop request arrives"""
+        import threading
+
+        if warm_calendar is not None:
+            self.session(warm_calendar).load()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            listener.bind(self.path)
+            os.chmod(self.path, 0o600)
+            listener.listen()
+            listener.settimeout(0.5)
+            threading.Thread(target=self.refresh, daemon=True).start()
+            try:
+                while not self.stopping.is_set():
+                    try:
+                        connection, _ = listener.accept()
+                    except socket.timeout:
+                        continue
+                    with connection:
+                        connection.settimeout(None)
+                        try:
+                            self.handle(connection)
+                        except Exception as error:
+                            # A client that went away does not stop the others
+                            print("Request failed: {!r}".format(error))
+            finally:
+                self.stopping.set()
+                os.remove(self.path)
+
+
+def serve(argv):
+    import argparse
+
+    import main
+    from google_calendar import cal
+
+    parser = argparse.ArgumentParser(description="Run the wlog daemon")
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument(
+        "--refresh",
+        type=float,
+        default=REFRESH_INTERVAL,
+        metavar="SECONDS",
+        help="Time between two background fetches of the changes",
+    )
+    parser.add_argument(
+        "-c", "--calendar", default="Work Hours", help="Calendar to load at start"
+    )
+    args = parser.parse_args(argv)
+    daemon = Daemon(cal.authenticate(), main.load_config(), socket_path(), args.refresh)
+    print("Listening on", daemon.path)
+    daemon.serve(warm_calendar=args.calendar)
+
+
+def client(argv):
+    path = socket_path()
+    if argv == ["--stop"]:
+        request = {"stop": True}
+    else:
+        request = {"argv": argv}
+    try:
+        answer = send(path, request)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if request.get("stop"):
+            print("No daemon is running")
+            return 1
+        import main
+
+        sys.argv = ["main.py"] + argv
+        main.main()
+        return 0
+    sys.stdout.write(answer["output"])
+    return answer["status"]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        serve(sys.argv[1:])
+    else:
+        sys.exit(client(sys.argv[1:]))
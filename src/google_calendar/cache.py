@@ -0,0 +1,176 @@
+import datetime
+import json
+import os
+import re
+import tempfile
+
+from utils.event import parse_time
+
+CACHE_DIR = os.environ.get("WLOG_CACHE_DIR", ".wlog-cache")
+
+
+def cache_path(name):
+    return os.path.join(CACHE_DIR, name)
+
+
+def calendar_cache_path(prefix, calendar_id):
+    return cache_path("{}-{}.json".format(prefix, re.sub(r"[^\w.-]", "_", calendar_id)))
+
+
+def load_json(path, default=None):
+    try:
+        with open(path, "r") as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    """Write data as JSON to path, replacing the old file atomically"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def event_start(event):
+    return parse_time(event["start"])
+
+
+def start_date_key(event):
+    """Return the start date of event as an ISO string, without parsing it
+
+    It is the date in the event's own UTC offset, as event_start(event).date().
+    """
+    start = event["start"]
+    return start.get("dateTime", start.get("date"))[:10]
+
+
+class EventCache:
+    """Local copy of a calendar kept up to date with the sync token"""
+
+    def __init__(self, path, sync_token=None, events=None, touched=None):
+        self.path = path
+        self.sync_token = sync_token
+        self.events = events if events is not None else {}
+        # Start dates of the events changed since take_touched was last
+        # called, None when everything must be considered changed
+        self.touched = set(touched) if touched is not None else None
+
+    @classmethod
+    def load(cls, calendar_id):
+        path = calendar_cache_path("events", calendar_id)
+        data = load_json(path, {})
+        return cls(
+            path, data.get("syncToken"), data.get("events", {}), data.get("touched")
+        )
+
+    def save(self):
+        save_json(
+            self.path,
+            {
+                "syncToken": self.sync_token,
+                "events": self.events,
+                "touched": None if self.touched is None else sorted(self.touched),
+            },
+        )
+
+    def clear(self):
+        self.sync_token = None
+        self.events = {}
+        self.touched = None
+
+    def take_touched(self):
+        """Return the touched dates, or None for all, and start a new set
+
+        Save the cache afterwards so that the dates are not returned again.
+        """
+        touched = self.touched
+        self.touched = set()
+        if touched is None:
+            return None
+        return {datetime.date.fromisoformat(date) for date in touched}
+
+    def apply(self, items):
+        """Apply inserted, updated and cancelled events, return the changed ids"""
+        changed = []
+        for item in items:
+            old = self.events.get(item["id"])
+            if item.get("status") == "cancelled":
+                if old is None:
+                    continue
+                del self.events[item["id"]]
+            else:
+                self.events[item["id"]] = item
+            if self.touched is not None:
+                for event in (old, item):
+                    if event is not None and "start" in event:
+                        self.touched.add(event_start(event).date().isoformat())
+            changed.append(item["id"])
+        return changed
+
+    def sorted_events(self):
+        return sorted(self.events.values(), key=event_start)
+
+
+def is_open(event):
+    """Return true for a started event without an end, of zero duration"""
+    return "start" in event and parse_time(event["end"]) == event_start(event)
+
+
+class OngoingIndex:
+    """Open events of a calendar and the time up to which changes are known
+
+    It is kept small so that start and stop do not read the whole history.
+    """
+
+    def __init__(self, path, checked=None, events=None):
+        self.path = path
+        self.checked = checked
+        self.events = events if events is not None else {}
+
+    @classmethod
+    def load(cls, calendar_id):
+        path = calendar_cache_path("ongoing", calendar_id)
+        data = load_json(path, {})
+        checked = data.get("checked")
+        if checked is not None:
+            checked = datetime.datetime.fromisoformat(checked)
+        return cls(path, checked, data.get("events", {}))
+
+    def save(self):
+        save_json(
+            self.path,
+            {
+                "checked": None if self.checked is None else self.checked.isoformat(),
+                "events": self.events,
+            },
+        )
+
+    def stale(self, now, max_age):
+        return self.checked is None or now - self.checked > max_age
+
+    def invalidate(self):
+        self.checked = None
+        self.events = {}
+
+    def rebuild(self, items, checked):
+        self.events = {item["id"]: item for item in items if is_open(item)}
+        self.checked = checked
+
+    def apply(self, items):
+        """Apply inserted, updated and cancelled events"""
+        for item in items:
+            if item.get("status") != "cancelled" and is_open(item):
+                self.events[item["id"]] = item
+            else:
+                self.events.pop(item["id"], None)
+
+    def sorted_events(self):
+        return sorted(self.events.values(), key=event_start)
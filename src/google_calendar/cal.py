@@ -1,18 +1,47 @@
+import concurrent.futures
+import datetime
 import os
+import time
 
-import pickle
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-import pytz
+# The Google client libraries take a noticeable part of a second to import,
+# they are imported in the functions that talk to the API.
+
+from google_calendar.cache import (
+    EventCache,
+    cache_path,
+    event_start,
+    load_json,
+    save_json,
+)
+from google_calendar.transport import CountingHttp, HttpPool
+from utils import stats
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/calendar/v3/rest"
+
+# Seconds a resolved calendar name is trusted before the list is fetched again
+CALENDAR_IDS_TTL = 24 * 3600
+
+# Requests per call to the batch endpoint
+BATCH_SIZE = 50
+
+# Shards fetched at the same time in parallel mode
+PARALLEL_WORKERS = 4
+
+# The parts of an event that wlog reads, the rest is not downloaded
+EVENT_FIELDS = "id,status,etag,summary,description,location,start,end"
+LIST_FIELDS = "nextPageToken,nextSyncToken,items({})".format(EVENT_FIELDS)
+
+# Largest page of events the API serves
+MAX_PAGE_SIZE = 2500
+
+_calendar_ids = {}
+
 
 def generate_event(start, end, summary, description, location):
-    utc = pytz.timezone("UTC")
-    utc_start = start.astimezone(utc)
-    utc_end = end.astimezone(utc)
+    utc_start = start.astimezone(datetime.timezone.utc)
+    utc_end = end.astimezone(datetime.timezone.utc)
     return {
         "summary": summary,
         "location": location,
@@ -34,57 +63,400 @@ def generate_event(start, end, summary, description, location):
     }
 
 
-def get_calendar_id(service, calendar_name):
+def is_calendar_id(calendar_name):
+    """Return true if calendar_name is a raw calendar ID rather than a name"""
+    return calendar_name == "primary" or "@" in calendar_name
+
+
+def _execute(service, request):
+    """Execute the request of one page of a listing"""
+    with stats.phase("fetch page"):
+        response = request.execute()
+    stats.count("pages")
+    return response
+
+
+def fetch_calendar_ids(service):
+    calendar_ids = {}
     page_token = None
     while True:
-        calendar_list = service.calendarList().list(pageToken=page_token).execute()
+        calendar_list = _execute(
+            service, service.calendarList().list(pageToken=page_token)
+        )
         for calendar_list_entry in calendar_list["items"]:
-            if calendar_list_entry["summary"] == calendar_name:
-                return calendar_list_entry["id"]
+            calendar_ids.setdefault(
+                calendar_list_entry["summary"], calendar_list_entry["id"]
+            )
         page_token = calendar_list.get("nextPageToken")
         if not page_token:
             break
-    return None
+    return calendar_ids
+
+
+def get_calendar_id(service, calendar_name):
+    """Resolve a calendar name to its ID
+
+    The mapping is kept for the rest of the process and stored on disk for
+    CALENDAR_IDS_TTL seconds. Raw calendar IDs are returned as they are.
+    """
+    if is_calendar_id(calendar_name):
+        return calendar_name
+    if calendar_name in _calendar_ids:
+        return _calendar_ids[calendar_name]
+    with stats.phase("calendar id"):
+        return _load_calendar_id(service, calendar_name)
+
+
+def _load_calendar_id(service, calendar_name):
+    path = cache_path("calendars.json")
+    stored = load_json(path, {})
+    if time.time() - stored.get("fetched", 0) > CALENDAR_IDS_TTL or (
+        calendar_name not in stored.get("ids", {})
+    ):
+        stored = {"fetched": time.time(), "ids": fetch_calendar_ids(service)}
+        save_json(path, stored)
+    _calendar_ids.update(stored["ids"])
+    return _calendar_ids.get(calendar_name)
 
 
-def get_all_events(service, calendar_id):
-    ret_events = []
+def cached_calendar_id(calendar_name):
+    """Resolve a calendar name from the cache only, None if it is not there"""
+    if is_calendar_id(calendar_name):
+        return calendar_name
+    if calendar_name not in _calendar_ids:
+        stored = load_json(cache_path("calendars.json"), {})
+        _calendar_ids.update(stored.get("ids", {}))
+    return _calendar_ids.get(calendar_name)
+
+
+def invalidate_calendar_ids():
+    _calendar_ids.clear()
+    try:
+        os.remove(cache_path("calendars.json"))
+    except FileNotFoundError:
+        pass
+
+
+def _fetch_sync_token(service, calendar_id):
+    """Walk the full listing for its sync token only, without the events"""
     page_token = None
     while True:
-        events = (
-            service.events()
-            .list(
+        events = _execute(
+            service,
+            service.events().list(
                 calendarId=calendar_id,
                 pageToken=page_token,
-                orderBy="startTime",
                 singleEvents=True,
-            )
-            .execute()
+                maxResults=MAX_PAGE_SIZE,
+                fields="nextPageToken,nextSyncToken",
+            ),
         )
-        ret_events = ret_events + events.get("items", [])
+        page_token = events.get("nextPageToken")
+        if not page_token:
+            return events.get("nextSyncToken")
+
+
+def _sync_pages(service, calendar_id, cache):
+    changed = []
+    page_token = None
+    while True:
+        events = _execute(
+            service,
+            service.events().list(
+                calendarId=calendar_id,
+                pageToken=page_token,
+                syncToken=cache.sync_token,
+                singleEvents=True,
+                maxResults=MAX_PAGE_SIZE,
+                fields=LIST_FIELDS,
+            ),
+        )
+        changed.extend(cache.apply(events.get("items", [])))
         page_token = events.get("nextPageToken")
         if not page_token:
             break
-    return ret_events
-
-
-def authenticate():
-    creds = None
-    # The file token.pickle stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists("token.pickle"):
-        with open("token.pickle", "rb") as token:
-            creds = pickle.load(token)
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+    cache.sync_token = events.get("nextSyncToken")
+    return changed
+
+
+def _full_sync(service, calendar_id, cache, workers):
+    if not workers:
+        return _sync_pages(service, calendar_id, cache)
+    # Take the token before the events so that changes made while the
+    # shards download are fetched again by the next sync
+    sync_token = _fetch_sync_token(service, calendar_id)
+    changed = cache.apply(get_events(service, calendar_id, workers=workers))
+    cache.sync_token = sync_token
+    return changed
+
+
+def sync_events(service, calendar_id, cache, workers=None):
+    """Fetch the changes since the last sync into cache
+
+    Without a sync token, or when the server has expired it (410 Gone), the
+    whole calendar is downloaded again, in parallel shards if workers is
+    given. The cache is saved after a full download or changes only, the
+    previous sync token stays valid otherwise. Returns the ids of changed
+    events.
+    """
+    from googleapiclient.errors import HttpError
+
+    with stats.phase("sync"):
+        full = cache.sync_token is None
+        try:
+            if full:
+                changed = _full_sync(service, calendar_id, cache, workers)
+            else:
+                changed = _sync_pages(service, calendar_id, cache)
+        except HttpError as error:
+            if error.resp.status != 410:
+                raise
+            cache.clear()
+            full = True
+            changed = _full_sync(service, calendar_id, cache, workers)
+        if full or changed:
+            cache.save()
+    return changed
+
+
+def get_all_events(service, calendar_id, workers=None):
+    cache = EventCache.load(calendar_id)
+    sync_events(service, calendar_id, cache, workers)
+    return cache.sorted_events()
+
+
+def _rfc3339(date):
+    return datetime.datetime.combine(date, datetime.time()).astimezone().isoformat()
+
+
+def _quarter_shards(start_date, end_date):
+    """Split start_date to end_date into calendar quarters
+
+    The last shard is open ended when end_date is None.
+    """
+    shard_start = start_date
+    last = end_date or datetime.date.today()
+    while True:
+        first_month = (shard_start.month - 1) // 3 * 3 + 1
+        if first_month == 10:
+            next_start = datetime.date(shard_start.year + 1, 1, 1)
         else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open("token.pickle", "wb") as token:
-            pickle.dump(creds, token)
+            next_start = datetime.date(shard_start.year, first_month + 3, 1)
+        if next_start > last:
+            yield shard_start, end_date
+            return
+        yield shard_start, next_start - datetime.timedelta(days=1)
+        shard_start = next_start
+
+
+def get_events_parallel(
+    service, calendar_id, start_date=None, end_date=None, workers=PARALLEL_WORKERS
+):
+    """Like get_events, but fetch each quarter of the range concurrently"""
+    if start_date is None:
+        first_event = get_first_event(service, calendar_id)
+        if first_event is None:
+            return []
+        start_date = event_start(first_event).date()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        shards = executor.map(
+            lambda shard: get_events(service, calendar_id, *shard),
+            _quarter_shards(start_date, end_date),
+        )
+        ret_events = {}
+        for shard in shards:
+            for event in shard:
+                # Events spanning a shard border are returned by both shards
+                ret_events.setdefault(event["id"], event)
+    return sorted(ret_events.values(), key=event_start)
+
+
+def get_events(service, calendar_id, start_date=None, end_date=None, workers=None):
+    """Return the events of the days start_date to end_date, inclusive
+
+    See iter_events. With workers, the range is fetched in parallel shards.
+    """
+    if workers:
+        return get_events_parallel(
+            service, calendar_id, start_date, end_date, workers=workers
+        )
+    return list(iter_events(service, calendar_id, start_date, end_date))
+
+
+def iter_events(service, calendar_id, start_date=None, end_date=None):
+    """Yield the events of the days start_date to end_date in start order
+
+    The window is passed to the server as timeMin/timeMax, padded with a day
+    on each side since events are dated in their own UTC offset. Callers
+    should filter the result on the exact dates. Pages are fetched as the
+    events are consumed. An empty range yields nothing without a request.
+    """
+    if start_date is not None and end_date is not None and start_date > end_date:
+        return
+    query = {}
+    if start_date is not None:
+        query["timeMin"] = _rfc3339(start_date - datetime.timedelta(days=1))
+    if end_date is not None:
+        query["timeMax"] = _rfc3339(end_date + datetime.timedelta(days=2))
+    page_token = None
+    while True:
+        events = _execute(
+            service,
+            service.events().list(
+                calendarId=calendar_id,
+                pageToken=page_token,
+                orderBy="startTime",
+                singleEvents=True,
+                maxResults=MAX_PAGE_SIZE,
+                fields=LIST_FIELDS,
+                **query
+            ),
+        )
+        yield from events.get("items", [])
+        page_token = events.get("nextPageToken")
+        if not page_token:
+            break
+
+
+def iter_updated_events(service, calendar_id, updated_min):
+    """Yield the events changed or deleted since the datetime updated_min"""
+    page_token = None
+    while True:
+        events = _execute(
+            service,
+            service.events().list(
+                calendarId=calendar_id,
+                pageToken=page_token,
+                updatedMin=updated_min.isoformat(),
+                singleEvents=True,
+                showDeleted=True,
+                maxResults=MAX_PAGE_SIZE,
+                fields=LIST_FIELDS,
+            ),
+        )
+        yield from events.get("items", [])
+        page_token = events.get("nextPageToken")
+        if not page_token:
+            break
+
+
+def get_first_event(service, calendar_id):
+    events = _execute(
+        service,
+        service.events().list(
+            calendarId=calendar_id,
+            orderBy="startTime",
+            singleEvents=True,
+            maxResults=1,
+            fields=LIST_FIELDS,
+        ),
+    )
+    items = events.get("items", [])
+    return items[0] if items else None
+
+
+def conditional_get(service, calendar_id, event_id, cached=None):
+    """Return a request getting an event
+
+    With the cached copy of the event, the server answers 304 Not Modified
+    instead of sending it again if its ETag has not changed.
+    """
+    request = service.events().get(
+        calendarId=calendar_id, eventId=event_id, fields=EVENT_FIELDS
+    )
+    if cached is not None and "etag" in cached:
+        request.headers["If-None-Match"] = cached["etag"]
+    return request
+
+
+def execute_batch(service, requests, batch_size=BATCH_SIZE):
+    """Send requests through the batch endpoint, batch_size at a time
+
+    requests is a list of (key, request) pairs with unique string keys.
+    Returns a dict from each key to its (response, exception) pair.
+    """
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+
+    for i in range(0, len(requests), batch_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for key, request in requests[i : i + batch_size]:
+            batch.add(request, request_id=key)
+        with stats.phase("batch"):
+            batch.execute()
+        stats.count("batched calls", len(requests[i : i + batch_size]))
+    return results
+
+
+def discovery_document():
+    """Return the Calendar API discovery document
+
+    It is read from the cache folder, or else from the copy bundled with
+    googleapiclient, and only downloaded if neither exists.
+    """
+    path = cache_path("calendar-v3.json")
+    try:
+        with open(path, "r") as discovery_file:
+            return discovery_file.read()
+    except FileNotFoundError:
+        pass
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = get_static_doc("calendar", "v3")
+    except ImportError:
+        document = None
+    if document is None:
+        import httplib2
+
+        _, content = httplib2.Http().request(DISCOVERY_URL)
+        document = content.decode("utf-8")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as discovery_file:
+        discovery_file.write(document)
+    return document
+
+
+def build_service(http):
+    """Build the Calendar service on top of an HTTP transport
+
+    The requests and bytes of the transport are counted in utils.stats.
+    """
+    from googleapiclient.discovery import build_from_document
+
+    return build_from_document(discovery_document(), http=CountingHttp(http))
+
+
+def authenticate(wrap_http=None):
+    """Return the Calendar service of the user
+
+    All requests, from any thread, share one pool of keep-alive connections.
+    The first connection is opened, and an expiring access token refreshed,
+    in the background while the command gets started.
+
+    wrap_http, if given, is called with the authorized transport and returns
+    the transport the service uses, for example to record the requests.
+    """
+    from google_calendar.credentials import CredentialManager, ManagedHttp
+
+    pool = HttpPool()
+    pool.connect(DISCOVERY_URL)
+    manager = CredentialManager.load(pool, SCOPES)
+    # If there are no usable credentials available, let the user log in.
+    if manager is None or not (
+        manager.credentials.valid or manager.credentials.refresh_token
+    ):
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+        manager = CredentialManager(flow.run_local_server(port=0), pool)
+        manager.save()
+    manager.start()
 
-    return build("calendar", "v3", credentials=creds)
+    http = ManagedHttp(manager, pool)
+    if wrap_http is not None:
+        http = wrap_http(http)
+    return build_service(http)
@@ -0,0 +1,138 @@
+"""OAuth credentials of the user and the transport that applies them
+
+The token is stored as JSON in TOKEN_FILE, readable by the user only. The
+access token is refreshed from a background thread REFRESH_MARGIN before
+it expires, so requests do not wait for it, and ManagedHttp can be shared
+by all threads.
+"""
+
+import datetime
+import json
+import threading
+
+from google_calendar.cache import save_json
+from utils import stats
+
+TOKEN_FILE = "token.json"
+
+# Time before the expiry of the access token when it is refreshed
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+# Seconds before retrying a failed background refresh
+RETRY_DELAY = 30
+
+
+def _utcnow():
+    # google-auth keeps the expiry as a naive UTC time
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class CredentialManager:
+    """Hold the credentials of the user and refresh them ahead of expiry
+
+    http carries the refresh requests.
+    """
+
+    def __init__(self, credentials, http, path=TOKEN_FILE, margin=REFRESH_MARGIN):
+        self.credentials = credentials
+        self.http = http
+        self.path = path
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    @classmethod
+    def load(cls, http, scopes, path=TOKEN_FILE):
+        """Return the manager of the stored token, None if there is none"""
+        from google.oauth2.credentials import Credentials
+
+        try:
+            credentials = Credentials.from_authorized_user_file(path, scopes)
+        except (FileNotFoundError, ValueError):
+            return None
+        return cls(credentials, http, path)
+
+    def save(self):
+        save_json(self.path, json.loads(self.credentials.to_json()))
+
+    def expires_soon(self):
+        if self.credentials.token is None:
+            return True
+        expiry = self.credentials.expiry
+        return expiry is not None and expiry - _utcnow() < self.margin
+
+    def fresh(self):
+        """Refresh the access token if it expires within the margin"""
+        with self.lock:
+            if self.expires_soon():
+                self._refresh()
+
+    def refresh(self, rejected):
+        """Refresh the access token after the server rejected it
+
+        Threads rejected with the same token share a single refresh.
+        """
+        with self.lock:
+            if self.credentials.token == rejected:
+                self._refresh()
+
+    def _refresh(self):
+        from google_auth_httplib2 import Request
+
+        with stats.phase("token refresh"):
+            self.credentials.refresh(Request(self.http))
+        self.save()
+
+    def start(self):
+        """Keep the access token fresh from a background thread"""
+        threading.Thread(target=self._keep_fresh, daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def _keep_fresh(self):
+        delay = 0
+        while not self.stopping.wait(delay):
+            try:
+                self.fresh()
+            except Exception:
+                # The next request reports the error
+                delay = RETRY_DELAY
+                continue
+            expiry = self.credentials.expiry
+            if expiry is None:
+                return
+            delay = max((expiry - self.margin - _utcnow()).total_seconds(), 1)
+
+
+class ManagedHttp:
+    """Authorize the requests of http with the credentials of manager
+
+    Unlike google_auth_httplib2.AuthorizedHttp, it may be used by several
+    threads at once if http can.
+    """
+
+    def __init__(self, manager, http):
+        self.manager = manager
+        self.http = http
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    @property
+    def credentials(self):
+        return self.manager.credentials
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        for attempt in range(2):
+            self.manager.fresh()
+            token = self.credentials.token
+            request_headers = dict(headers or {})
+            self.credentials.apply(request_headers, token=token)
+            response, content = self.http.request(
+                uri, method=method, body=body, headers=request_headers, **kwargs
+            )
+            if response.status != 401 or attempt:
+                break
+            self.manager.refresh(rejected=token)
+        return response, content
@@ -0,0 +1,223 @@
+import json
+import os
+import uuid
+
+from google_calendar import cal
+from google_calendar.cache import cache_path, is_open
+
+
+class Journal:
+    """Append-only log of changes made while offline
+
+    Each line is a JSON entry with the operation ("insert" or "patch"), the
+    calendar name, the event id and the request body. Inserted events get
+    their id here, so replaying an insert twice is detected by the server.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def load(cls):
+        return cls(cache_path("journal.jsonl"))
+
+    def entries(self):
+        entries = []
+        try:
+            with open(self.path, "r") as journal_file:
+                for line in journal_file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A write cut short by a crash
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def append(self, entry):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as journal_file:
+            journal_file.write(json.dumps(entry) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def insert(self, calendar, body):
+        event_id = uuid.uuid4().hex
+        self.append(
+            {
+                "op": "insert",
+                "calendar": calendar,
+                "id": event_id,
+                "body": dict(body, id=event_id),
+            }
+        )
+        return event_id
+
+    def patch(self, calendar, event_id, body, expect_open=False):
+        """Record a patch, expect_open marks it as a conflict if the event has
+        been stopped on the server in the meantime"""
+        self.append(
+            {
+                "op": "patch",
+                "calendar": calendar,
+                "id": event_id,
+                "body": body,
+                "expect_open": expect_open,
+            }
+        )
+
+    def rewrite(self, entries):
+        if not entries:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as journal_file:
+            for entry in entries:
+                journal_file.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def pending_events(self, calendar):
+        """Return the API bodies of the events of calendar as the journal
+        leaves them: inserted events and patches keyed by event id"""
+        inserted = {}
+        patches = {}
+        for entry in self.entries():
+            if entry["calendar"] != calendar:
+                continue
+            if entry["op"] == "insert":
+                inserted[entry["id"]] = dict(entry["body"])
+            elif entry["id"] in inserted:
+                inserted[entry["id"]].update(entry["body"])
+            else:
+                patches.setdefault(entry["id"], {}).update(entry["body"])
+        return inserted, patches
+
+
+def replay(service, journal):
+    """Send the journal to the server in batches
+
+    Inserts go first, so that later patches can refer to them. Patches
+    expecting an ongoing event are dropped as conflicts if the server copy
+    has been stopped or removed. Entries that fail for other reasons, such
+    as a calendar name that does not resolve, stay in the journal. Returns
+    a list of (entry, outcome) pairs.
+    """
+    entries = journal.entries()
+    if not entries:
+        return []
+    calendar_ids = {}
+    for entry in entries:
+        if entry["calendar"] not in calendar_ids:
+            calendar_ids[entry["calendar"]] = cal.get_calendar_id(
+                service, entry["calendar"]
+            )
+
+    outcomes = {}
+    for i, entry in enumerate(entries):
+        if calendar_ids[entry["calendar"]] is None:
+            outcomes[str(i)] = "failed: unknown calendar"
+    inserts = [
+        (str(i), e)
+        for i, e in enumerate(entries)
+        if e["op"] == "insert" and str(i) not in outcomes
+    ]
+    results = cal.execute_batch(
+        service,
+        [
+            (
+                key,
+                service.events().insert(
+                    calendarId=calendar_ids[entry["calendar"]], body=entry["body"]
+                ),
+            )
+            for key, entry in inserts
+        ],
+    )
+    unsent = set()
+    for key, entry in inserts:
+        _, exception = results[key]
+        if exception is None:
+            outcomes[key] = "inserted"
+        elif exception.resp.status == 409:
+            # Already sent by an earlier, interrupted replay
+            outcomes[key] = "inserted"
+        else:
+            outcomes[key] = "failed: {}".format(exception)
+            unsent.add((entry["calendar"], entry["id"]))
+
+    # Merge the patches of each event, in journal order
+    patches = {}
+    for i, entry in enumerate(entries):
+        if entry["op"] != "patch" or str(i) in outcomes:
+            continue
+        target = (entry["calendar"], entry["id"])
+        if target in unsent:
+            outcomes[str(i)] = "failed: the event is not inserted yet"
+            continue
+        if target not in patches:
+            patches[target] = {"keys": [], "body": {}, "expect_open": False}
+        patches[target]["keys"].append(str(i))
+        patches[target]["body"].update(entry["body"])
+        patches[target]["expect_open"] |= entry.get("expect_open", False)
+
+    targets = [*patches]
+    current = cal.execute_batch(
+        service,
+        [
+            (
+                str(i),
+                service.events().get(
+                    calendarId=calendar_ids[calendar], eventId=event_id
+                ),
+            )
+            for i, (calendar, event_id) in enumerate(targets)
+        ],
+    )
+    to_patch = []
+    for i, target in enumerate(targets):
+        event, exception = current[str(i)]
+        patch = patches[target]
+        if exception is not None and exception.resp.status not in (404, 410):
+            outcome = "failed: {}".format(exception)
+        elif exception is not None or event.get("status") == "cancelled":
+            outcome = "conflict: event was deleted"
+        elif patch["expect_open"] and not is_open(event):
+            outcome = "conflict: event was already stopped"
+        else:
+            to_patch.append((str(i), target))
+            continue
+        for key in patch["keys"]:
+            outcomes[key] = outcome
+
+    results = cal.execute_batch(
+        service,
+        [
+            (
+                key,
+                service.events().patch(
+                    calendarId=calendar_ids[calendar],
+                    eventId=event_id,
+                    body=patches[(calendar, event_id)]["body"],
+                ),
+            )
+            for key, (calendar, event_id) in to_patch
+        ],
+    )
+    for key, target in to_patch:
+        _, exception = results[key]
+        outcome = "patched" if exception is None else "failed: {}".format(exception)
+        for patch_key in patches[target]["keys"]:
+            outcomes[patch_key] = outcome
+
+    journal.rewrite(
+        [
+            entry
+            for i, entry in enumerate(entries)
+            if outcomes[str(i)].startswith("failed")
+        ]
+    )
+    return [(entry, outcomes[str(i)]) for i, entry in enumerate(entries)]
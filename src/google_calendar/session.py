@@ -0,0 +1,232 @@
+import datetime
+
+from google_calendar import cal
+from google_calendar.cache import EventCache, OngoingIndex, start_date_key
+from utils import event_utils
+from utils.event import from_api_items
+
+# Age after which the index of open events is rebuilt from the whole calendar
+ONGOING_MAX_AGE = datetime.timedelta(days=7)
+
+# Margin on the time of the last check for clocks that disagree
+CLOCK_SLACK = datetime.timedelta(minutes=5)
+
+
+class Session:
+    """The service, calendar and events of one wlog invocation
+
+    The local event cache is synced at most once, the first time the events
+    are needed. Commands report the events they insert, patch and delete so
+    that later readers, like the day summary, see the changes without
+    another download.
+
+    The open events are also kept in a small index, checked against the
+    changes made on the server since its last check, so that start and stop
+    do not need the whole calendar.
+    """
+
+    def __init__(self, service, calendar_name, workers=None):
+        self.service = service
+        self.calendar_name = calendar_name
+        self.workers = workers
+        self._calendar_id = None
+        self.cache = None
+        self.loaded = False
+        self.dirty = False
+        self._events = None
+        self._events_by_date = None
+        self.ongoing = None
+        self.ongoing_dirty = False
+
+    @property
+    def calendar_id(self):
+        if self._calendar_id is None:
+            self._calendar_id = cal.get_calendar_id(self.service, self.calendar_name)
+        return self._calendar_id
+
+    def _cache(self):
+        if self.cache is None:
+            self.cache = EventCache.load(self.calendar_id)
+        return self.cache
+
+    def has_cache(self):
+        """Return true if a synced copy of the calendar is on disk or loaded"""
+        return self.loaded or self._cache().sync_token is not None
+
+    def load(self):
+        """Sync the event cache once and return it"""
+        if not self.loaded:
+            self.refresh()
+        return self.cache
+
+    def refresh(self):
+        """Fetch the changes made since the last sync into the events"""
+        checked = _now()
+        cache = self._cache()
+        changed = cal.sync_events(self.service, self.calendar_id, cache, self.workers)
+        if changed:
+            self._events = None
+            self._events_by_date = None
+        self.loaded = True
+
+        ongoing = self._ongoing()
+        if ongoing.stale(checked, ONGOING_MAX_AGE):
+            ongoing.rebuild(cache.events.values(), checked)
+        else:
+            ongoing.apply(
+                cache.events.get(event_id, {"id": event_id, "status": "cancelled"})
+                for event_id in changed
+            )
+            ongoing.checked = checked
+        self.ongoing_dirty = True
+
+    def _ongoing(self):
+        if self.ongoing is None:
+            self.ongoing = OngoingIndex.load(self.calendar_id)
+        return self.ongoing
+
+    def ongoing_events(self):
+        """Return the open events as records in start order
+
+        Loaded events are up to date. Otherwise only the changes since the
+        index was last checked are fetched, and a stale index is rebuilt by
+        loading the calendar.
+        """
+        from googleapiclient.errors import HttpError
+
+        ongoing = self._ongoing()
+        if not self.loaded and ongoing.stale(_now(), ONGOING_MAX_AGE):
+            self.load()
+        elif not self.loaded:
+            checked = _now()
+            try:
+                ongoing.apply(
+                    cal.iter_updated_events(
+                        self.service, self.calendar_id, ongoing.checked - CLOCK_SLACK
+                    )
+                )
+                ongoing.checked = checked
+            except HttpError as error:
+                if error.resp.status != 410:
+                    raise
+                self.load()
+            self.ongoing_dirty = True
+        return from_api_items(ongoing.sorted_events())
+
+    def invalidate_ongoing(self):
+        """Rebuild the index of open events on its next use"""
+        ongoing = self._ongoing()
+        ongoing.invalidate()
+        ongoing.save()
+
+    def events(self):
+        """Return the events of the calendar as records in start order"""
+        if self._events is None:
+            self._events = from_api_items(self.load().sorted_events())
+        return self._events
+
+    def events_by_date(self):
+        if self._events_by_date is None:
+            self._events_by_date = event_utils.index_by_date(self.events())
+        return self._events_by_date
+
+    def events_on(self, dates):
+        """Return the loaded events starting on dates, indexed by date
+
+        Only the events of those dates are parsed, unless all already are.
+        """
+        if self._events_by_date is not None or not dates:
+            return {date: self.events_by_date().get(date, []) for date in dates}
+        keys = {date.isoformat() for date in dates}
+        items = [
+            item for item in self.load().events.values() if start_date_key(item) in keys
+        ]
+        return event_utils.index_by_date(from_api_items(items))
+
+    def first_date(self):
+        """Return the start date of the first loaded event, None without any"""
+        keys = map(start_date_key, self.load().events.values())
+        first = min(keys, default=None)
+        return None if first is None else datetime.date.fromisoformat(first)
+
+    def events_between(self, start_date, end_date):
+        """Return the events starting on start_date to end_date, inclusive
+
+        Loaded events are read from memory, otherwise only the range is
+        fetched.
+        """
+        if self.loaded:
+            dates = []
+            date = start_date
+            while date <= end_date:
+                dates.append(date)
+                date += datetime.timedelta(days=1)
+            events_by_date = self.events_on(dates)
+            return [event for date in dates for event in events_by_date.get(date, [])]
+        items = cal.get_events(
+            self.service, self.calendar_id, start_date, end_date, self.workers
+        )
+        return [
+            event
+            for event in from_api_items(items)
+            if start_date <= event.start.date() <= end_date
+        ]
+
+    def cached_event(self, event_id):
+        """Return the local copy of an event, None if there is none"""
+        event = self._ongoing().events.get(event_id)
+        if event is None:
+            event = self._cache().events.get(event_id)
+        return event
+
+    def get_events_by_id(self, event_ids):
+        """Return the resource and exception of each event, fetched in batches
+
+        Events with a local copy are only downloaded if they have changed.
+        """
+        cached = {event_id: self.cached_event(event_id) for event_id in event_ids}
+        results = cal.execute_batch(
+            self.service,
+            [
+                (
+                    event_id,
+                    cal.conditional_get(
+                        self.service, self.calendar_id, event_id, cached[event_id]
+                    ),
+                )
+                for event_id in event_ids
+            ],
+        )
+        for event_id, (event, exception) in results.items():
+            if exception is not None and exception.resp.status == 304:
+                results[event_id] = (cached[event_id], None)
+        return results
+
+    def record(self, *items):
+        """Apply inserted, patched or cancelled event resources"""
+        self._ongoing().apply(items)
+        self.ongoing_dirty = True
+        if not self.loaded:
+            # The next sync fetches them from the server
+            return
+        self.cache.apply(items)
+        self.dirty = True
+        self._events = None
+        self._events_by_date = None
+
+    def forget(self, *event_ids):
+        self.record(
+            *({"id": event_id, "status": "cancelled"} for event_id in event_ids)
+        )
+
+    def close(self):
+        if self.dirty:
+            self.cache.save()
+            self.dirty = False
+        if self.ongoing_dirty:
+            self.ongoing.save()
+            self.ongoing_dirty = False
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
@@ -0,0 +1,270 @@
+"""Snapshots of a calendar, to move its history or restore it
+
+A snapshot is gzip compressed NDJSON, one event resource per line. Imports
+also read plain NDJSON and the CSV of list --format csv.
+
+Each exported event names its calendar. Imported back into it, an event
+keeps its id: the ones still there are left alone and the deleted ones are
+brought back. Other events get an id derived from their source. Either
+way an event sent twice, by an import cut short or a second import of the
+same snapshot, is refused by the server instead of duplicated. The
+progress of an import is kept in a checkpoint file of the cache, and an
+interrupted import resumes after the last batch it completed.
+"""
+
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from google_calendar import cal
+from google_calendar.cache import cache_path, event_start, load_json, save_json
+
+# The parts of an event that are copied
+IMPORTED_FIELDS = ("summary", "description", "location", "start", "end")
+
+# Events sent between two checkpoints
+CHUNK_SIZE = cal.BATCH_SIZE
+
+# Attempts of an insert refused for the request rate or a server error,
+# with a delay doubling from RETRY_DELAY seconds
+RETRIES = 4
+RETRY_DELAY = 1.0
+
+
+def write_snapshot(items, path, calendar_id):
+    """Write the event resources of items to path, return their number"""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as snapshot:
+        for item in items:
+            if item.get("status") == "cancelled":
+                continue
+            snapshot.write(json.dumps(dict(item, calendarId=calendar_id)) + "\n")
+            count += 1
+    return count
+
+
+def _open(path):
+    with open(path, "rb") as source:
+        compressed = source.read(2) == b"\x1f\x8b"
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def read_snapshot(path):
+    """Return the (source id, event resource) pairs of a snapshot or CSV
+
+    Events without an id are identified by their content.
+    """
+    with _open(path) as source:
+        if path.endswith(".csv"):
+            pairs = [(row.get("id"), _from_csv(row)) for row in csv.DictReader(source)]
+        else:
+            items = [json.loads(line) for line in source if line.strip()]
+            pairs = [(item.get("id"), item) for item in items]
+    return [(source_id or content_id(item), item) for source_id, item in pairs]
+
+
+def content_id(item):
+    """Return a source id made of the imported fields of item"""
+    return "content:" + json.dumps(
+        {field: item.get(field) for field in IMPORTED_FIELDS}, sort_keys=True
+    )
+
+
+def _from_csv(row):
+    event = {}
+    for entity in ("start", "end"):
+        moment = datetime.datetime.fromisoformat(row[entity])
+        if row.get("all_day") == "True":
+            event[entity] = {"date": moment.date().isoformat()}
+            continue
+        if moment.tzinfo is None:
+            moment = moment.astimezone()
+        event[entity] = {
+            "dateTime": moment.astimezone(datetime.timezone.utc).isoformat(),
+            "timeZone": "UTC",
+        }
+    for field in ("summary", "description", "location"):
+        event[field] = row.get(field) or ""
+    return event
+
+
+def in_range(items, start_date=None, end_date=None):
+    """Yield the events of items starting on start_date to end_date"""
+    for item in items:
+        date = event_start(item).date()
+        if start_date is not None and date < start_date:
+            continue
+        if end_date is not None and date > end_date:
+            continue
+        yield item
+
+
+def import_id(source_id):
+    """Return the event id of an imported event, valid for the API"""
+    return hashlib.sha1(source_id.encode("utf-8")).hexdigest()
+
+
+def is_restored(source_id, item, calendar_id):
+    """Return true if item goes back to the calendar it was exported from"""
+    return item.get("calendarId") == calendar_id and item.get("id") == source_id
+
+
+def import_body(source_id, item, calendar_id):
+    body = {field: item[field] for field in IMPORTED_FIELDS if field in item}
+    if is_restored(source_id, item, calendar_id):
+        body["id"] = source_id
+    else:
+        body["id"] = import_id(source_id)
+    return body
+
+
+class Checkpoint:
+    """Number of events of a snapshot already sent to a calendar, and the
+    lines that failed"""
+
+    def __init__(self, path, done=0, failed=None):
+        self.path = path
+        self.done = done
+        self.failed = failed if failed is not None else []
+
+    @classmethod
+    def load(cls, snapshot_path, calendar_id):
+        key = "{}\n{}".format(os.path.abspath(snapshot_path), calendar_id)
+        name = "import-{}.json".format(hashlib.sha1(key.encode("utf-8")).hexdigest())
+        path = cache_path(name)
+        stored = load_json(path, {})
+        return cls(path, stored.get("done", 0), stored.get("failed"))
+
+    def save(self):
+        save_json(self.path, {"done": self.done, "failed": self.failed})
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _retry(exception):
+    status = exception.resp.status
+    if status == 403:
+        return b"ateLimitExceeded" in (exception.content or b"")
+    return status in (429, 500, 502, 503)
+
+
+def insert_chunk(service, calendar_id, bodies, retries=RETRIES):
+    """Insert bodies in batches, retrying the ones refused for the rate
+
+    Returns a dict from the index of each body to its (event, outcome),
+    where event is None unless the outcome is "inserted".
+    """
+    results = {}
+    pending = [*range(len(bodies))]
+    delay = RETRY_DELAY
+    for attempt in range(retries):
+        if attempt:
+            time.sleep(delay)
+            delay *= 2
+        batch = cal.execute_batch(
+            service,
+            [
+                (
+                    str(i),
+                    service.events().insert(calendarId=calendar_id, body=bodies[i]),
+                )
+                for i in pending
+            ],
+        )
+        retried = []
+        for i in pending:
+            event, exception = batch[str(i)]
+            if exception is None:
+                results[i] = (event, "inserted")
+            elif exception.resp.status == 409:
+                results[i] = (None, "already there")
+            elif _retry(exception) and attempt + 1 < retries:
+                retried.append(i)
+            else:
+                results[i] = (None, "failed: {}".format(exception))
+        pending = retried
+        if not pending:
+            break
+    return results
+
+
+def restore_chunk(service, calendar_id, bodies):
+    """Bring back the deleted events of bodies, which keep their id
+
+    Returns a dict from the index of each body to its (event, outcome).
+    """
+    batch = cal.execute_batch(
+        service,
+        [
+            (
+                str(i),
+                service.events().patch(
+                    calendarId=calendar_id,
+                    eventId=body["id"],
+                    body=dict(body, status="confirmed"),
+                ),
+            )
+            for i, body in enumerate(bodies)
+        ],
+    )
+    results = {}
+    for i in range(len(bodies)):
+        event, exception = batch[str(i)]
+        if exception is None:
+            results[i] = (event, "restored")
+        else:
+            results[i] = (None, "failed: {}".format(exception))
+    return results
+
+
+def import_records(session, records, checkpoint, chunk_size=CHUNK_SIZE):
+    """Insert the records after the checkpoint in chunks
+
+    Yields (line, outcome) of each record sent. The checkpoint is saved
+    after each chunk, and removed at the end.
+    """
+    calendar_id = session.calendar_id
+    for start in range(checkpoint.done, len(records), chunk_size):
+        chunk = records[start : start + chunk_size]
+        bodies = [
+            import_body(source_id, item, calendar_id) for source_id, item in chunk
+        ]
+        results = insert_chunk(session.service, calendar_id, bodies)
+        # An event of this calendar refused as already there may have been
+        # deleted, the synced events tell
+        conflicts = [
+            i
+            for i, (source_id, item) in enumerate(chunk)
+            if results[i][1] == "already there"
+            and is_restored(source_id, item, calendar_id)
+        ]
+        if conflicts:
+            live = session.load().events
+            deleted = [i for i in conflicts if bodies[i]["id"] not in live]
+            restored = restore_chunk(
+                session.service, calendar_id, [bodies[i] for i in deleted]
+            )
+            for j, i in enumerate(deleted):
+                results[i] = restored[j]
+        inserted = []
+        for i in range(len(chunk)):
+            event, outcome = results[i]
+            if event is not None:
+                inserted.append(event)
+            if outcome.startswith("failed"):
+                checkpoint.failed.append(start + i)
+            yield start + i, outcome
+        session.record(*inserted)
+        checkpoint.done = start + len(chunk)
+        checkpoint.save()
+    checkpoint.remove()
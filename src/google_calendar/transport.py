@@ -0,0 +1,293 @@
+"""Transports of the Calendar API service
+
+RecordingHttp wraps the transport of a service and writes each exchange to
+a JSON cassette. ReplayHttp serves a cassette without network access, with
+a configurable latency per request, and can re-page recorded event lists.
+Both count the round trips they see. CountingHttp adds the requests and
+bytes of any transport to utils.stats. HttpPool shares keep-alive
+connections between threads.
+"""
+
+import json
+import queue
+import re
+import threading
+import time
+import urllib.parse
+
+from utils import stats
+
+# Response headers worth keeping, the rest may identify the account
+KEPT_HEADERS = ("status", "content-type", "etag")
+
+PAGING_PARAMETERS = ("pageToken", "maxResults")
+
+DEFAULT_PAGE_SIZE = 250
+
+_BOUNDARY_ID = re.compile(r"Content-ID: <(?:response-)?([^ +>]+) \+")
+
+
+def _split_uri(uri):
+    """Return the path and the query parameters of uri"""
+    parts = urllib.parse.urlsplit(uri)
+    return parts.path, urllib.parse.parse_qsl(parts.query)
+
+
+def _key(method, uri, ignored=()):
+    path, query = _split_uri(uri)
+    query = sorted((name, value) for name, value in query if name not in ignored)
+    return "{} {}?{}".format(method, path, urllib.parse.urlencode(query))
+
+
+def _is_event_list(method, uri):
+    return method == "GET" and _split_uri(uri)[0].endswith("/events")
+
+
+def _is_batch(uri):
+    return _split_uri(uri)[0].startswith("/batch")
+
+
+def _content_text(content):
+    if isinstance(content, bytes):
+        return content.decode("utf-8")
+    return content
+
+
+class RecordingHttp:
+    """Pass requests on to http and record them in a cassette
+
+    Requests are made one at a time, so worker threads can share it.
+    """
+
+    thread_safe = True
+
+    def __init__(self, http, path):
+        self.http = http
+        self.path = path
+        self.interactions = []
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Let googleapiclient find the credentials of the wrapped transport
+        return getattr(self.http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        with self._lock:
+            response, content = self.http.request(
+                uri, method=method, body=body, headers=headers, **kwargs
+            )
+            self.round_trips += 1
+            self.interactions.append(
+                {
+                    "method": method,
+                    "uri": uri,
+                    "status": response.status,
+                    "headers": {
+                        name: value
+                        for name, value in response.items()
+                        if name in KEPT_HEADERS
+                    },
+                    "content": _content_text(content),
+                }
+            )
+        return response, content
+
+    def save(self):
+        with open(self.path, "w") as cassette:
+            json.dump({"interactions": self.interactions}, cassette, indent=1)
+
+
+class ReplayHttp:
+    """Serve the exchanges of a cassette in place of the network
+
+    Requests are matched on method, path and query, ignoring paging. Event
+    lists are re-paged with page_size items per page, or else as many as the
+    request asks for or the recording had.
+    Requests without an exact match are served the next recording with the
+    same method and path, so that time windows relative to today still
+    replay on another day.
+    """
+
+    thread_safe = True
+
+    def __init__(self, interactions, latency=0.0, page_size=None):
+        self.latency = latency
+        self.page_size = page_size
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._by_path = {}
+        self._event_lists = {}
+        for interaction in interactions:
+            method, uri = interaction["method"], interaction["uri"]
+            if _is_event_list(method, uri):
+                self._add_event_page(interaction)
+                continue
+            self._exact.setdefault(_key(method, uri), []).append(interaction)
+            path = "{} {}".format(method, _split_uri(uri)[0])
+            self._by_path.setdefault(path, []).append(interaction)
+
+    @classmethod
+    def load(cls, path, latency=0.0, page_size=None):
+        with open(path, "r") as cassette:
+            return cls(json.load(cassette)["interactions"], latency, page_size)
+
+    def _add_event_page(self, interaction):
+        """Join the recorded pages of each event list query"""
+        key = _key(interaction["method"], interaction["uri"], PAGING_PARAMETERS)
+        page = json.loads(interaction["content"])
+        query = dict(_split_uri(interaction["uri"])[1])
+        if "pageToken" not in query or key not in self._event_lists:
+            self._event_lists[key] = {"items": [], "last": {}, "page_size": None}
+        recorded = self._event_lists[key]
+        recorded["items"].extend(page.get("items", []))
+        if "nextPageToken" in page:
+            recorded["page_size"] = len(page.get("items", []))
+        self._event_lists[key]["last"] = {
+            name: value
+            for name, value in page.items()
+            if name not in ("items", "nextPageToken")
+        }
+
+    def _similar_event_list(self, method, uri):
+        """Return the recorded list of the calendar with the same parameters"""
+        path, query = _split_uri(uri)
+        names = {name for name, _ in query if name not in PAGING_PARAMETERS}
+        candidates = []
+        for key in self._event_lists:
+            recorded_path, recorded_query = _split_uri(key.split(" ", 1)[1])
+            if key.split(" ", 1)[0] != method or recorded_path != path:
+                continue
+            same = {name for name, _ in recorded_query} == names
+            candidates.append((not same, key))
+        return min(candidates)[1] if candidates else None
+
+    def _event_page(self, method, uri):
+        key = _key(method, uri, PAGING_PARAMETERS)
+        if key not in self._event_lists:
+            key = self._similar_event_list(method, uri)
+            if key is None:
+                return None
+        recorded = self._event_lists[key]
+        query = dict(_split_uri(uri)[1])
+        page_size = (
+            self.page_size
+            or int(query.get("maxResults", 0))
+            or recorded["page_size"]
+            or DEFAULT_PAGE_SIZE
+        )
+        offset = int(query.get("pageToken", "0").replace("replay-", "") or 0)
+        page = dict(
+            recorded["last"], items=recorded["items"][offset : offset + page_size]
+        )
+        if offset + page_size < len(recorded["items"]):
+            page["nextPageToken"] = "replay-{}".format(offset + page_size)
+            page.pop("nextSyncToken", None)
+        return {
+            "status": 200,
+            "headers": {"content-type": "application/json"},
+            "content": json.dumps(page),
+        }
+
+    def _next(self, method, uri):
+        for queue in (
+            self._exact.get(_key(method, uri)),
+            self._by_path.get("{} {}".format(method, _split_uri(uri)[0])),
+        ):
+            if queue:
+                interaction = queue.pop(0)
+                # Keep the last recording for repeated requests
+                if not queue:
+                    queue.append(interaction)
+                return interaction
+        return None
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        import httplib2
+
+        with self._lock:
+            self.round_trips += 1
+            if _is_event_list(method, uri):
+                interaction = self._event_page(method, uri)
+            else:
+                interaction = self._next(method, uri)
+        if self.latency:
+            time.sleep(self.latency)
+        if interaction is None:
+            return httplib2.Response({"status": 404}), b'{"error": "not recorded"}'
+        content = interaction["content"]
+        if _is_batch(uri) and body:
+            # Answer with the Content-IDs of this batch, not the recorded one
+            request_ids = _BOUNDARY_ID.search(_content_text(body))
+            response_ids = _BOUNDARY_ID.search(content)
+            if request_ids and response_ids:
+                content = content.replace(response_ids.group(1), request_ids.group(1))
+        response = httplib2.Response(dict(interaction["headers"]))
+        response.status = interaction["status"]
+        return response, content.encode("utf-8")
+
+
+class CountingHttp:
+    """Pass requests on to http, counting them and their bytes in utils.stats"""
+
+    def __init__(self, http):
+        self.http = http
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        with stats.phase("http"):
+            response, content = self.http.request(
+                uri, method=method, body=body, headers=headers, **kwargs
+            )
+        stats.count("requests")
+        stats.count("bytes", len(content or b""))
+        return response, content
+
+
+class HttpPool:
+    """httplib2 transports shared by all threads
+
+    Each request borrows an idle transport, the most recently used first as
+    its connections are the most likely to still be open, and gives it back
+    afterwards.
+    """
+
+    thread_safe = True
+
+    def __init__(self, factory=None):
+        self.factory = factory
+        self.idle = queue.LifoQueue()
+
+    def _new(self):
+        if self.factory is not None:
+            return self.factory()
+        from googleapiclient.http import build_http
+
+        return build_http()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        try:
+            http = self.idle.get_nowait()
+        except queue.Empty:
+            http = self._new()
+        try:
+            return http.request(
+                uri, method=method, body=body, headers=headers, **kwargs
+            )
+        finally:
+            self.idle.put(http)
+
+    def connect(self, uri):
+        """Open a connection to the host of uri from a background thread"""
+
+        def head():
+            try:
+                self.request(uri, method="HEAD")
+            except Exception:
+                # The first real request connects instead
+                pass
+
+        threading.Thread(target=head, daemon=True).start()
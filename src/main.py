@@ -1,15 +1,30 @@
 #!/usr/bin/env python
 
+import concurrent.futures
 import datetime
-import pytz
+import json
+import os
 import sys
+import time
 import argparse
-import yaml
-from string import Template
 
-from utils import event_utils
-
-from google_calendar import cal
+from utils import event_utils, report, stats
+from utils.event import Event, from_api_items, iter_api_items
+from utils.rollup import DEFAULT_HORIZON, Rollups
+from utils.schedule import Schedule
+
+from google_calendar import cal, snapshot
+from google_calendar.cache import (
+    EventCache,
+    OngoingIndex,
+    calendar_cache_path,
+    is_open,
+    load_json,
+    save_json,
+)
+from google_calendar.journal import Journal, replay
+from google_calendar.session import Session
+from google_calendar.transport import RecordingHttp, ReplayHttp
 
 # cal.get_all_events, cal.get_calendar_id, cal.authenticate
 
@@ -23,62 +38,31 @@ FULLDAYOFFS = [
 IGNORED = ["JOUR", "COMPENSATION"]
 
 
-class bcolors:
-    HEADER = "\033[95m"
-    OKBLUE = "\033[94m"
-    OKCYAN = "\033[96m"
-    OKGREEN = "\033[92m"
-    YELLOW = "\033[93m"
-    WEEKEND = "\033[91m"
-    ENDC = "\033[0m"
-    BOLD = "\033[1m"
-    UNDERLINE = "\033[4m"
-
-
 class WorkHours:
-    def __init__(self, service, config, args):
-        self.expected_work_hours = config["expected"]
+    def __init__(self, service, config, args, session=None):
+        self.expected = config["expected"]
+        self.schedule = Schedule(self.expected)
         self.args = args
         self.service = service
+        if session is None:
+            session = Session(service, args.calendar, workers=args.parallel)
+        self.session = session
 
     def planned(self, date):
-        for expected_work_time in self.expected_work_hours:
-            exp_date = datetime.datetime.strptime(
-                expected_work_time["startdate"], "%Y-%m-%d"
-            ).date()
-            if exp_date < date:
-                return datetime.timedelta(
-                    hours=expected_work_time["hours"][date.weekday()]
-                )
-        return datetime.timedelta(hours=7, minutes=12)
-
-    def total_worktime(self, events):
-        duration = datetime.timedelta()
-        for event in events:
-            if event["summary"] in FULLDAYOFFS:
-                duration = duration + self.planned(
-                    event_utils.get_datetime(event, "start").date()
-                )
-            elif event["summary"] not in IGNORED:
-                duration = duration + event_utils.event_duration(event)
-        return duration
+        return self.schedule.planned(date)
 
     def total_worktime(self, events):
         duration = datetime.timedelta()
         for event in events:
-            if event["summary"] in FULLDAYOFFS:
-                duration = duration + self.planned(
-                    event_utils.get_datetime(event, "start").date()
-                )
-            elif event["summary"] not in IGNORED:
+            if event.summary in FULLDAYOFFS:
+                duration = duration + self.planned(event.start.date())
+            elif event.summary not in IGNORED:
                 duration = duration + event_utils.event_duration(event)
         return duration
 
     def day_summary(self):
         today = datetime.datetime.now().date()
-        calendar_id = cal.get_calendar_id(self.service, self.args.calendar)
-        all_events = cal.get_all_events(self.service, calendar_id)
-        events_on_day = event_utils.get_events_on_date(all_events, today)
+        events_on_day = self.session.events_between(today, today)
         total_worktime = self.total_worktime(events_on_day)
         print(
             f"\nTotal time worked today: {total_worktime}/{self.planned(today)}",
@@ -87,74 +71,218 @@ class WorkHours:
             ),
         )
 
+    def fingerprint(self):
+        """Identify the rules the rollups are computed with"""
+        return json.dumps(
+            [self.expected, FULLDAYOFFS, IGNORED], sort_keys=True, default=str
+        )
+
+    def day_seconds(self, events_by_date, date):
+        """Return the worked and planned seconds of date"""
+        worktime = self.total_worktime(events_by_date.get(date, []))
+        return worktime.total_seconds(), self.planned(date).total_seconds()
+
+    def update_rollups(self):
+        """Sync the event cache and recompute the open and changed days
+
+        Only the events of those days are parsed. The cache and the rollups
+        are saved when they changed.
+        """
+        cache = self.session.load()
+        touched = cache.take_touched()
+        # Taking the touched dates changes the cache
+        cache_changed = touched != set()
+        today = datetime.datetime.now().date()
+        first_date = self.session.first_date() or today
+
+        path = calendar_cache_path("rollups", self.session.calendar_id)
+        rollups = Rollups(load_json(path))
+        if touched is None or not rollups.matches(self.fingerprint(), first_date):
+            rollups.reset(self.fingerprint(), first_date)
+            touched = set()
+
+        dates = {date for date in touched if first_date <= date <= today}
+        dates = sorted(dates.union(rollups.open_dates(today)))
+        events_by_date = self.session.events_on(dates)
+        for date in dates:
+            rollups.set_day(date, *self.day_seconds(events_by_date, date))
+        rollups.close(today - datetime.timedelta(days=self.args.horizon))
+        if rollups.dirty:
+            save_json(path, rollups.to_json())
+        if cache_changed:
+            cache.save()
+        return rollups
+
+    def missing_days(self, rollups, dates):
+        """Return the events of the dates the rollups do not hold, by date"""
+        return self.session.events_on(
+            [date for date in dates if date not in rollups.days]
+        )
+
     def summary(self):
-        calendar_id = cal.get_calendar_id(self.service, self.args.calendar)
-        all_events = cal.get_all_events(self.service, calendar_id)
+        if self.args.engine == "numpy":
+            self.columnar_summary()
+            return
+        with stats.phase("rollups"):
+            rollups = self.update_rollups()
 
         # The size of each step in days
         day_delta = datetime.timedelta(days=1)
 
         start_date = self.args.start.date()
-        first_date = get_first_date(all_events).date()
+        first_date = rollups.first_date
         if start_date < first_date:
             start_date = first_date
         end_date = self.args.end.date()
 
+        out = report.writer(self.args.format, report.SUMMARY_FIELDS)
         acc_time_diff_total = 0.0
         acc_time_diff_week = 0.0
         acc_time_diff_month = 0.0
 
-        for i in range((end_date - start_date).days + 1):
-            date = start_date + i * day_delta
-            if date.weekday() == 0:
-                if self.args.weeks:
-                    print(
-                        " ** WEEK {} SUMMARY: ".format(
-                            (date - day_delta).isocalendar()[1]
-                        )
-                        + event_utils.format_time_diff(acc_time_diff_week)
-                    )
-                acc_time_diff_week = 0.0
-            if date.day == 1:
-                if self.args.months:
-                    print(
-                        " **** {} SUMMARY: ".format((date - day_delta).strftime("%B"))
-                        + event_utils.format_time_diff(acc_time_diff_month)
+        # Without per period output, start from the checkpoint balance
+        if (
+            start_date == first_date
+            and rollups.closed_until is not None
+            and rollups.closed_until < end_date
+            and not (self.args.days or self.args.weeks or self.args.months)
+        ):
+            acc_time_diff_total = rollups.closed_balance
+            start_date = rollups.closed_until + day_delta
+
+        planned_days = self.schedule.planned_range(start_date, end_date)
+        dates = [start_date + i * day_delta for i in range(len(planned_days))]
+        events_by_date = self.missing_days(rollups, dates)
+        day_graphs = [None] * len(planned_days)
+        if self.args.days and out.graph:
+            with stats.phase("graph"):
+                day_graphs = event_utils.graph_days(
+                    self.session.events_by_date(),
+                    dates,
+                    start=datetime.time(0, 0, 0),
+                    end=datetime.time(23, 59, 59),
+                    resolution=datetime.timedelta(minutes=15),
+                )
+        with stats.phase("day loop"):
+            for i, planned in enumerate(planned_days):
+                date = start_date + i * day_delta
+                if date.weekday() == 0:
+                    if self.args.weeks:
+                        out.week(date, acc_time_diff_week)
+                    acc_time_diff_week = 0.0
+                if date.day == 1:
+                    if self.args.months:
+                        out.month(date, acc_time_diff_month)
+                    acc_time_diff_month = 0.0
+
+                if date in rollups.days:
+                    worked_seconds, planned_seconds = rollups.days[date]
+                else:
+                    worked_seconds = self.day_seconds(events_by_date, date)[0]
+                    planned_seconds = planned.total_seconds()
+                day_time_diff = worked_seconds - planned_seconds
+                acc_time_diff_total += day_time_diff
+                acc_time_diff_week += day_time_diff
+                acc_time_diff_month += day_time_diff
+                if self.args.days:
+                    out.day(
+                        date,
+                        worked_seconds,
+                        day_time_diff,
+                        day_graphs[i],
+                        acc_time_diff_total,
                     )
-                acc_time_diff_month = 0.0
-
-            day_events = event_utils.get_events_on_date(all_events, date)
-            worktime = self.total_worktime(day_events)
-            acc_time_diff_total += time_diff(worktime, self.planned(date))
-            acc_time_diff_week += time_diff(worktime, self.planned(date))
-            acc_time_diff_month += time_diff(worktime, self.planned(date))
-            if self.args.days:
-                color = ""
-                if date.weekday() == 5 or date.weekday() == 6:
-                    color = bcolors.WEEKEND
-                print(
-                    color,
-                    date,
-                    format_timedelta(worktime),
-                    event_utils.format_time_diff(
-                        time_diff(worktime, self.planned(date))
-                    ),
-                    event_utils.graph(
-                        day_events,
-                        start=datetime.time(0, 0, 0),
-                        end=datetime.time(23, 59, 59),
-                        resolution=datetime.timedelta(minutes=15),
-                    ),
-                    bcolors.ENDC,
-                    event_utils.format_time_diff(acc_time_diff_total),
+        out.total(acc_time_diff_total)
+        out.close()
+
+    def balance(self, start_date, end_date):
+        """Return the worked and planned seconds of start_date to end_date"""
+        rollups = self.update_rollups()
+        if start_date < rollups.first_date:
+            start_date = rollups.first_date
+        worked_total = planned_total = 0.0
+        planned_days = self.schedule.planned_range(start_date, end_date)
+        dates = [
+            start_date + datetime.timedelta(days=i) for i in range(len(planned_days))
+        ]
+        events_by_date = self.missing_days(rollups, dates)
+        for date, planned in zip(dates, planned_days):
+            if date in rollups.days:
+                worked_seconds, planned_seconds = rollups.days[date]
+            else:
+                worked_seconds = self.day_seconds(events_by_date, date)[0]
+                planned_seconds = planned.total_seconds()
+            worked_total += worked_seconds
+            planned_total += planned_seconds
+        return worked_total, planned_total
+
+    def columnar_summary(self):
+        """Compute the summary on NumPy columns of the events
+
+        It does not use the rollups and prints the same as summary.
+        """
+        try:
+            from utils import columnar
+        except ImportError:
+            print("The numpy engine needs NumPy installed")
+            sys.exit(1)
+
+        with stats.phase("columns"):
+            columns = columnar.EventColumns.from_events(self.session.events())
+        if self.args.export:
+            columns.save(self.args.export)
+
+        start_date = self.args.start.date()
+        first_date = columns.first_date() or datetime.datetime.now().date()
+        if start_date < first_date:
+            start_date = first_date
+        end_date = self.args.end.date()
+
+        planned = columnar.microseconds(
+            self.schedule.planned_range(start_date, end_date)
+        )
+        with stats.phase("day loop"):
+            worked = columns.worked(start_date, planned, FULLDAYOFFS, IGNORED)
+            balances = columnar.balances(start_date, worked, planned)
+        seconds = {name: values / 1e6 for name, values in balances.items()}
+
+        out = report.writer(self.args.format, report.SUMMARY_FIELDS)
+        day_graphs = [None] * len(planned)
+        if self.args.days and out.graph:
+            with stats.phase("graph"):
+                day_graphs = event_utils.graph_days(
+                    self.session.events_by_date(),
+                    [
+                        start_date + datetime.timedelta(days=i)
+                        for i in range(len(planned))
+                    ],
+                    start=datetime.time(0, 0, 0),
+                    end=datetime.time(23, 59, 59),
+                    resolution=datetime.timedelta(minutes=15),
                 )
-        print("Total: " + event_utils.format_time_diff(acc_time_diff_total))
+        if self.args.days or self.args.weeks or self.args.months:
+            for i in range(len(planned)):
+                date = start_date + datetime.timedelta(days=i)
+                if date.weekday() == 0 and self.args.weeks:
+                    out.week(date, float(seconds["week"][i]))
+                if date.day == 1 and self.args.months:
+                    out.month(date, float(seconds["month"][i]))
+                if self.args.days:
+                    out.day(
+                        date,
+                        float(worked[i] / 1e6),
+                        float(seconds["daily"][i]),
+                        day_graphs[i],
+                        float(seconds["total"][i]),
+                    )
+        total = float(seconds["total"][-1]) if len(planned) else 0.0
+        out.total(total)
+        out.close()
 
 
 def generate_event(start, end, summary, description, location):
-    utc = pytz.timezone("UTC")
-    utc_start = start.astimezone(utc)
-    utc_end = end.astimezone(utc)
+    utc_start = start.astimezone(datetime.timezone.utc)
+    utc_end = end.astimezone(datetime.timezone.utc)
     return {
         "summary": summary,
         "location": location,
@@ -176,34 +304,38 @@ def generate_event(start, end, summary, description, location):
     }
 
 
-def create_new_event(service, event, args):
-    calendar_id = cal.get_calendar_id(service, args.calendar)
-    event = service.events().insert(calendarId=calendar_id, body=event).execute()
+def create_new_event(session, event, args):
+    if args.offline:
+        event_id = Journal.load().insert(args.calendar, event)
+        print("Event journaled: %s" % event_id)
+        return
+    event = (
+        session.service.events()
+        .insert(calendarId=session.calendar_id, body=event)
+        .execute()
+    )
+    session.record(event)
     print("Event created: %s" % (event.get("htmlLink")))
 
 
 def start(args, service, wh):
-    ongoing_events = find_ongoing_events(service, args)
+    ongoing_events = find_ongoing_events(wh.session, args)
     if len(ongoing_events) > 0:
         print("There are {} ongoing evnts, consider stopping them before starting new.")
         for event in ongoing_events:
             print(event_utils.format_event(event))
         if len(ongoing_events) == 1:
             if query_yes_no("Stop the ongoing event at this time", default="no"):
-                utc = pytz.timezone("UTC")
-                event = ongoing_events[0]
                 end_time = datetime.datetime.combine(
                     args.date.date(), args.start.time()
                 )
-                utc_end = end_time.astimezone(utc)
-                event["end"]["dateTime"] = utc_end.isoformat()
-                calendar_id = cal.get_calendar_id(service, args.calendar)
-                updated_event = (
-                    service.events()
-                    .update(calendarId=calendar_id, eventId=event["id"], body=event)
-                    .execute()
+                update_event(
+                    ongoing_events[0].id,
+                    {"end": utc_time(end_time)},
+                    wh.session,
+                    args,
+                    expect_open=True,
                 )
-                print(updated_event["updated"])
         else:
             if not args.force and not query_yes_no("Start event anyway", default="no"):
                 sys.exit(0)
@@ -212,13 +344,12 @@ def start(args, service, wh):
     event = generate_event(
         start_time, start_time, args.summary, args.description, args.location
     )
-    create_new_event(service, event, args)
+    create_new_event(wh.session, event, args)
 
 
 def stop(args, service, wh):
-    calendar_id = cal.get_calendar_id(service, args.calendar)
     # Find latest event with same start and stop time
-    possible_events = find_ongoing_events(service, args)
+    possible_events = find_ongoing_events(wh.session, args)
 
     if len(possible_events) == 1:
         event = possible_events[0]
@@ -233,23 +364,13 @@ def stop(args, service, wh):
     # Confirm update
     if args.force or query_yes_no("Stop that event", "no"):
         # Update event
-        new_event = patch_event(event, args)
-        updated_event = (
-            service.events()
-            .update(calendarId=calendar_id, eventId=new_event["id"], body=new_event)
-            .execute()
-        )
-        print(updated_event["updated"])
+        update_event(event.id, patch_event(args), wh.session, args, expect_open=True)
 
 
-def find_ongoing_events(service, args):
-    calendar_id = cal.get_calendar_id(service, args.calendar)
-    all_events = cal.get_all_events(service, calendar_id)
-    possible_events = []
-    for event in all_events:
-        if event_utils.event_duration(event).total_seconds() == 0.0:
-            possible_events.append(event)
-    return possible_events
+def find_ongoing_events(session, args):
+    if args.offline:
+        return find_journaled_ongoing_events(args)
+    return session.ongoing_events()
 
 
 def query_yes_no(question, default="yes"):
@@ -283,54 +404,147 @@ def query_yes_no(question, default="yes"):
             sys.stdout.write("Please respond with 'yes' or 'no' (or 'y' or 'n').\n")
 
 
-def update_event(event, service, args):
-    calendar_id = cal.get_calendar_id(service, args.calendar)
-    updated_event = (
-        service.events()
-        .update(calendarId=calendar_id, eventId=event["id"], body=event)
-        .execute()
-    )
+def find_journaled_ongoing_events(args):
+    """Find the ongoing events from the local cache and the journal"""
+    inserted, patches = Journal.load().pending_events(args.calendar)
+    events = {}
+    calendar_id = cal.cached_calendar_id(args.calendar)
+    if calendar_id is not None:
+        ongoing = OngoingIndex.load(calendar_id)
+        if ongoing.checked is not None:
+            events.update(ongoing.events)
+        else:
+            events.update(EventCache.load(calendar_id).events)
+    for event_id, patch in patches.items():
+        if event_id in events:
+            events[event_id] = dict(events[event_id], **patch)
+    events.update(inserted)
+    return from_api_items(event for event in events.values() if is_open(event))
+
+
+def update_event(event_id, patch, session, args, expect_open=False):
+    """Patch an event, expect_open when it must still be ongoing"""
+    if args.offline:
+        Journal.load().patch(args.calendar, event_id, patch, expect_open)
+        print("Update journaled")
+        return
+    from googleapiclient.errors import HttpError
+
+    try:
+        updated_event = (
+            session.service.events()
+            .patch(calendarId=session.calendar_id, eventId=event_id, body=patch)
+            .execute()
+        )
+    except HttpError as error:
+        if expect_open and error.resp.status in (404, 410):
+            # The index of open events had an event that is gone
+            session.invalidate_ongoing()
+        raise
+    session.record(updated_event)
     print(updated_event["updated"])
 
 
-def patch_event(event, args):
-    utc = pytz.timezone("UTC")
+def utc_time(time):
+    utc = time.astimezone(datetime.timezone.utc)
+    return {"dateTime": utc.isoformat(), "timeZone": "UTC"}
+
+
+def patch_event(args):
+    """Return the fields of an event to change according to args"""
+    patch = {}
     if args.date:
         try:
             if args.start:
                 start_time = datetime.datetime.combine(
                     args.date.date(), args.start.time()
                 )
-                utc_start = start_time.astimezone(utc)
-                event["start"]["dateTime"] = utc_start.isoformat()
+                patch["start"] = utc_time(start_time)
         except AttributeError:
             pass
 
         if args.end:
             end_time = datetime.datetime.combine(args.date.date(), args.end.time())
-            utc_end = end_time.astimezone(utc)
-            event["end"]["dateTime"] = utc_end.isoformat()
+            patch["end"] = utc_time(end_time)
 
     if args.description:
-        event["description"] = args.description
+        patch["description"] = args.description
     if args.summary:
-        event["summary"] = args.summary
+        patch["summary"] = args.summary
     if args.location:
-        event["location"] = args.location
+        patch["location"] = args.location
+
+    return patch
 
-    return event
+
+def select_events(session, args):
+    """Return the events in the --from/--to range with the --match summary"""
+    if session.has_cache():
+        session.load()
+    events = session.events_between(args.range_start.date(), args.range_end.date())
+    if args.match is not None:
+        events = (event for event in events if event.summary == args.match)
+    return [*events]
+
+
+def report_batch(action, events, results):
+    for event in events:
+        _, exception = results[event.id]
+        if exception is None:
+            print(action, event_utils.format_event(event))
+        else:
+            print("Failed:", event_utils.format_event(event), exception)
+
+
+def bulk_update(args, service, wh):
+    patch = patch_event(args)
+    events = select_events(wh.session, args)
+    if not events:
+        print("No events found")
+        return
+    event_utils.print_events(events)
+    print("Patch {} events with:".format(len(events)))
+    print(patch)
+    if args.force or query_yes_no("Update the above events?", default="no"):
+        calendar_id = wh.session.calendar_id
+        results = cal.execute_batch(
+            service,
+            [
+                (
+                    event.id,
+                    service.events().patch(
+                        calendarId=calendar_id, eventId=event.id, body=patch
+                    ),
+                )
+                for event in events
+            ],
+        )
+        wh.session.record(
+            *(response for response, exception in results.values() if exception is None)
+        )
+        report_batch("Updated", events, results)
 
 
 def update(args, service, wh):
-    calendar_id = cal.get_calendar_id(service, args.calendar)
-    event = service.events().get(calendarId=calendar_id, eventId=args.id).execute()
+    if args.id is None:
+        if args.range_start is None or args.date is not None:
+            print("Give either --id or a --from/--to range without --date")
+            sys.exit(1)
+        if not patch_event(args):
+            print("Give the --summary, --description or --location to set")
+            sys.exit(1)
+        bulk_update(args, service, wh)
+        return
+    event, exception = wh.session.get_events_by_id([args.id])[args.id]
+    if exception is not None:
+        raise exception
     print("Replace event")
-    print(event_utils.format_event(event))
+    print(event_utils.format_event(Event.from_api(event)))
     print("with:")
-    new_event = patch_event(event, args)
-    print(new_event)
+    patch = patch_event(args)
+    print(patch)
     if args.force or query_yes_no("Update the above evetn?", default="no"):
-        update_event(new_event, service, args)
+        update_event(event["id"], patch, wh.session, args)
 
 
 def create(args, service, wh):
@@ -339,61 +553,92 @@ def create(args, service, wh):
     event = generate_event(
         start_time, end_time, args.summary, args.description, args.location
     )
-    create_new_event(service, event, args)
+    create_new_event(wh.session, event, args)
 
 
 def filter_events(events, start, end):
-    ret_events = []
+    """Yield the events starting on the dates from start to end"""
+    start_date = start.date()
+    end_date = end.date()
     for event in events:
-        event_start = event_utils.get_datetime(event, "start")
-        if event_start.date() >= start.date() and event_start.date() <= end.date():
-            ret_events.append(event)
-    return ret_events
+        date = event.start.date()
+        if date >= start_date and date <= end_date:
+            yield event
 
 
 def list(args, service, wh):
-    calendar_id = cal.get_calendar_id(service, args.calendar)
-    all_events = cal.get_all_events(service, calendar_id)
-    events = filter_events(all_events, args.start, args.end)
-    event_utils.print_events(events)
-
-
-def delete(args, service, wh):
-    for id in args.ids:
-        calendar_id = cal.get_calendar_id(service, args.calendar)
-        event = service.events().get(calendarId=calendar_id, eventId=id).execute()
-        print("Delete event")
-        print(event_utils.format_event(event))
-        if args.force or query_yes_no("Delete the above evetn?", default="no"):
-            service.events().delete(calendarId=calendar_id, eventId=id).execute()
-
-
-def get_first_date(all_events):
-    utc = pytz.utc
-    earliest_date = utc.localize(datetime.datetime.utcnow())
-    for event in all_events:
-        start = datetime.datetime.strptime(
-            event["start"].get("dateTime", event["start"].get("date")),
-            "%Y-%m-%dT%H:%M:%S%z",
+    if wh.session.has_cache():
+        wh.session.load()
+        events = wh.session.events_between(args.start.date(), args.end.date())
+        write_events(args, events)
+        return
+    calendar_id = wh.session.calendar_id
+    if args.parallel:
+        items = cal.get_events(
+            service,
+            calendar_id,
+            args.start.date(),
+            args.end.date(),
+            workers=args.parallel,
         )
-        if earliest_date > start:
-            earliest_date = start
-    return earliest_date
+    else:
+        items = cal.iter_events(
+            service, calendar_id, args.start.date(), args.end.date()
+        )
+    events = filter_events(iter_api_items(items), args.start, args.end)
+    write_events(args, events)
 
 
-class DeltaTemplate(Template):
-    delimiter = "%"
+def write_events(args, events):
+    out = report.writer(args.format, report.EVENT_FIELDS)
+    for event in events:
+        out.event(event)
+    out.close()
 
 
-def format_timedelta(tdelta, fmt="%H:%M:%S"):
-    d = {"D": tdelta.days}
-    hours, rem = divmod(tdelta.seconds, 3600)
-    minutes, seconds = divmod(rem, 60)
-    d["H"] = "{:02d}".format(hours)
-    d["M"] = "{:02d}".format(minutes)
-    d["S"] = "{:02d}".format(seconds)
-    t = DeltaTemplate(fmt)
-    return t.substitute(**d)
+def delete(args, service, wh):
+    if not args.ids and args.range_start is None:
+        print("Give either event ids or a --from/--to range")
+        sys.exit(1)
+    calendar_id = wh.session.calendar_id
+    events = []
+    if args.ids:
+        ids = [*dict.fromkeys(args.ids)]
+        results = wh.session.get_events_by_id(ids)
+        for id in ids:
+            event, exception = results[id]
+            if exception is not None:
+                print("Failed to get event {}:".format(id), exception)
+                continue
+            event = Event.from_api(event)
+            print("Delete event")
+            print(event_utils.format_event(event))
+            if args.force or query_yes_no("Delete the above evetn?", default="no"):
+                events.append(event)
+    elif args.range_start is not None:
+        events = select_events(wh.session, args)
+        event_utils.print_events(events)
+        if (
+            events
+            and not args.force
+            and not query_yes_no(
+                "Delete the above {} events?".format(len(events)), default="no"
+            )
+        ):
+            events = []
+
+    results = cal.execute_batch(
+        service,
+        [
+            (
+                event.id,
+                service.events().delete(calendarId=calendar_id, eventId=event.id),
+            )
+            for event in events
+        ],
+    )
+    wh.session.forget(*(event.id for event in events if results[event.id][1] is None))
+    report_batch("Deleted", events, results)
 
 
 def time_diff(actual_worktime, expected_worktime):
@@ -405,20 +650,256 @@ def summary(args, service, wh):
     wh.summary()
 
 
+def load_team(path):
+    """Return (calendar, config) of each member of a team file
+
+    Each member names its calendar and either holds its expected hours or
+    points to a YAML file of its own, relative to the team file.
+    """
+    import yaml
+
+    with open(path, "r") as team_file:
+        team = yaml.safe_load(team_file)
+    members = []
+    for member in team["team"]:
+        config = member
+        if "config" in member:
+            config_path = os.path.join(os.path.dirname(path), member["config"])
+            with open(config_path, "r") as config_file:
+                config = yaml.safe_load(config_file)
+        members.append((member["calendar"], config))
+    return members
+
+
+def member_balance(service, args, calendar, config):
+    """Return the worked and planned seconds of a team member"""
+    member_args = argparse.Namespace(**vars(args))
+    member_args.calendar = calendar
+    session = Session(service, calendar)
+    wh = WorkHours(service, config, member_args, session)
+    return wh.balance(args.start.date(), args.end.date())
+
+
+def team(args, service, wh):
+    members = load_team(args.team_file)
+    # Resolve the names once, the workers then share the calendar list
+    unknown = [
+        calendar
+        for calendar, _ in members
+        if cal.get_calendar_id(service, calendar) is None
+    ]
+    if unknown:
+        print("Unknown calendars: {}".format(", ".join(unknown)))
+        sys.exit(1)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(member_balance, service, args, calendar, config)
+            for calendar, config in members
+        ]
+
+    print(
+        "{:<30} {:>10} {:>10} {:>12}".format("Calendar", "Worked", "Planned", "Balance")
+    )
+    team_worked = team_planned = 0.0
+    for (calendar, _), future in zip(members, futures):
+        try:
+            worked, planned = future.result()
+        except Exception as error:
+            print("{:<30} failed: {}".format(calendar, error))
+            continue
+        team_worked += worked
+        team_planned += planned
+        print_balance(calendar, worked, planned)
+    print_balance("Team", team_worked, team_planned)
+
+
+def print_balance(name, worked_seconds, planned_seconds):
+    print(
+        "{:<30} {:>9.1f}h {:>9.1f}h {:>12}".format(
+            name,
+            worked_seconds / 3600,
+            planned_seconds / 3600,
+            event_utils.format_time_diff(worked_seconds - planned_seconds),
+        )
+    )
+
+
+def export_events(args, service, wh):
+    if wh.session.has_cache():
+        items = wh.session.load().sorted_events()
+    else:
+        items = cal.iter_events(service, wh.session.calendar_id)
+    start_date = args.start.date() if args.start else None
+    end_date = args.end.date() if args.end else None
+    count = snapshot.write_snapshot(
+        snapshot.in_range(items, start_date, end_date),
+        args.snapshot,
+        wh.session.calendar_id,
+    )
+    print("Exported {} events to {}".format(count, args.snapshot))
+
+
+def import_events(args, service, wh):
+    records = snapshot.read_snapshot(args.snapshot)
+    checkpoint = snapshot.Checkpoint.load(args.snapshot, wh.session.calendar_id)
+    if args.restart:
+        checkpoint = snapshot.Checkpoint(checkpoint.path)
+    elif checkpoint.done:
+        print("Resuming after {} of {} events".format(checkpoint.done, len(records)))
+    counts = {"inserted": 0, "restored": 0, "already there": 0, "failed": 0}
+    for index, outcome in snapshot.import_records(wh.session, records, checkpoint):
+        if outcome.startswith("failed"):
+            counts["failed"] += 1
+            print("Event {}: {}".format(index + 1, outcome))
+        else:
+            counts[outcome] += 1
+    print(
+        "Imported {} events, {} were already there, {} failed".format(
+            counts["inserted"], counts["already there"], counts["failed"]
+        )
+    )
+    if counts["restored"]:
+        print("Restored {} deleted events".format(counts["restored"]))
+    if checkpoint.failed:
+        print(
+            "Failed events: {}, run again with --restart to retry them".format(
+                ", ".join(str(index + 1) for index in checkpoint.failed)
+            )
+        )
+
+
+def flush(args, service, wh):
+    """Nothing to do, main replays the journal before every online command"""
+    if not args.journal_replayed:
+        print("The journal is empty")
+
+
+def replay_journal(service, args):
+    args.journal_replayed = False
+    for entry, outcome in replay(service, Journal.load()):
+        args.journal_replayed = True
+        # On stderr, ahead of the report of the command
+        print(
+            "Journal {} {}: {}".format(entry["op"], entry["id"], outcome),
+            file=sys.stderr,
+        )
+
+
 DATE_FORMAT = "%Y-%m-%d"
 TIME_FORMAT = "%H:%M"
 
 
-def main():
+def day_count(value):
+    """Parse a number of days, which cannot be negative"""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("must not be negative: {}".format(value))
+    return number
+
+
+def add_selection_arguments(parser):
+    parser.add_argument(
+        "--from",
+        dest="range_start",
+        metavar="DATE",
+        type=lambda s: datetime.datetime.strptime(s, DATE_FORMAT),
+        default=None,
+        help="First date of events to select instead of ids",
+    )
+    parser.add_argument(
+        "--to",
+        dest="range_end",
+        metavar="DATE",
+        type=lambda s: datetime.datetime.strptime(s, DATE_FORMAT),
+        default=datetime.datetime.now(),
+        help="Last date of events to select",
+    )
+    parser.add_argument(
+        "--match", default=None, help="Only select events with this summary"
+    )
+
+
+def add_format_argument(parser):
+    parser.add_argument(
+        "--format",
+        choices=report.FORMATS,
+        default="text",
+        help="Print for a terminal, or as JSON Lines or CSV rows for other programs",
+    )
+
+
+def build_parser():
 
     parser = argparse.ArgumentParser(
         description="Interact with a google calendar to log work time.\n\n"
     )
 
     parser.add_argument(
-        "-c", "--calendar", help="Which Calendar to work with", default="Work Hours"
+        "-c",
+        "--calendar",
+        help="Which Calendar to work with, by name or calendar ID",
+        default="Work Hours",
+    )
+    parser.add_argument(
+        "--refresh-calendars",
+        action="store_true",
+        help="Fetch the calendar list again instead of using the cached IDs",
     )
     parser.add_argument("-f", "--force", dest="force", action="store_true")
+    parser.add_argument(
+        "-o",
+        "--offline",
+        action="store_true",
+        help="Journal start, stop and create locally, send them with flush",
+    )
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        type=int,
+        default=0,
+        metavar="WORKERS",
+        help="Download long date ranges in quarters on this many threads",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="Record the API requests and responses to this file",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="Answer the API requests from a recorded file, without network",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="Milliseconds added to each replayed request",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of events per replayed page",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time of each phase and the API counters on stderr",
+    )
+    parser.add_argument(
+        "--stats",
+        metavar="FILE",
+        help="Write the phase times and API counters to a JSON file",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="Dump cProfile statistics, to be read with pstats",
+    )
 
     subparsers = parser.add_subparsers()
 
@@ -479,6 +960,7 @@ def main():
         "-l", "--location", default=None, help="Location of event"
     )
     parser_update.add_argument("-i", "--id", help="eventId of event to be removed")
+    add_selection_arguments(parser_update)
     parser_update.set_defaults(func=update)
 
     parser_start = subparsers.add_parser("start")
@@ -528,7 +1010,8 @@ def main():
     parser_stop.set_defaults(func=stop)
 
     parser_delete = subparsers.add_parser("delete")
-    parser_delete.add_argument("ids", nargs=argparse.REMAINDER)
+    parser_delete.add_argument("ids", nargs="*")
+    add_selection_arguments(parser_delete)
     parser_delete.set_defaults(func=delete)
 
     parser_list = subparsers.add_parser("list")
@@ -546,6 +1029,7 @@ def main():
         default=datetime.datetime.now(),
         help="End time for event",
     )
+    add_format_argument(parser_list)
     parser_list.set_defaults(func=list)
 
     parser_summary = subparsers.add_parser("summary")
@@ -566,18 +1050,199 @@ def main():
     parser_summary.add_argument("-d", "--days", action="store_true")
     parser_summary.add_argument("-w", "--weeks", action="store_true")
     parser_summary.add_argument("-m", "--months", action="store_true")
+    parser_summary.add_argument(
+        "--horizon",
+        type=day_count,
+        default=DEFAULT_HORIZON,
+        metavar="DAYS",
+        help="Days after which the stored daily balances are checkpointed",
+    )
+    parser_summary.add_argument(
+        "--engine",
+        choices=["python", "numpy"],
+        default="python",
+        help="Compute with the rollups or with NumPy over all events",
+    )
+    parser_summary.add_argument(
+        "--export",
+        metavar="FILE",
+        help="Write the event columns to a .npz file, with --engine numpy",
+    )
+    add_format_argument(parser_summary)
     parser_summary.set_defaults(func=summary)
 
-    args = parser.parse_args()
+    parser_team = subparsers.add_parser("team")
+    parser_team.add_argument(
+        "team_file", metavar="TEAM", help="YAML file listing the team calendars"
+    )
+    parser_team.add_argument(
+        "-s",
+        "--start",
+        type=lambda s: datetime.datetime.strptime(s, DATE_FORMAT),
+        default=datetime.datetime(1970, 1, 1),
+        help="First date of the balances",
+    )
+    parser_team.add_argument(
+        "-e",
+        "--end",
+        type=lambda s: datetime.datetime.strptime(s, DATE_FORMAT),
+        default=datetime.datetime.now(),
+        help="Last date of the balances",
+    )
+    parser_team.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=cal.PARALLEL_WORKERS,
+        help="Calendars fetched and computed at the same time",
+    )
+    parser_team.add_argument(
+        "--horizon",
+        type=day_count,
+        default=DEFAULT_HORIZON,
+        metavar="DAYS",
+        help="Days after which the stored daily balances are checkpointed",
+    )
+    parser_team.set_defaults(func=team)
+
+    parser_export = subparsers.add_parser("export")
+    parser_export.add_argument(
+        "snapshot", metavar="FILE", help="Snapshot to write, gzip compressed NDJSON"
+    )
+    parser_export.add_argument(
+        "-s",
+        "--start",
+        type=lambda s: datetime.datetime.strptime(s, DATE_FORMAT),
+        default=None,
+        help="First date of the events, all by default",
+    )
+    parser_export.add_argument(
+        "-e",
+        "--end",
+        type=lambda s: datetime.datetime.strptime(s, DATE_FORMAT),
+        default=None,
+        help="Last date of the events, all by default",
+    )
+    parser_export.set_defaults(func=export_events)
+
+    parser_import = subparsers.add_parser("import")
+    parser_import.add_argument(
+        "snapshot", metavar="FILE", help="Snapshot from export, NDJSON or list CSV"
+    )
+    parser_import.add_argument(
+        "--restart",
+        action="store_true",
+        help="Send the whole file again instead of resuming an interrupted import",
+    )
+    parser_import.set_defaults(func=import_events)
+
+    parser_flush = subparsers.add_parser("flush")
+    parser_flush.set_defaults(func=flush)
+
+    return parser
+
+
+def load_config():
+    import yaml
 
     with open("work-hours.yaml", "r") as config_file:
-        config = yaml.safe_load(config_file)
+        return yaml.safe_load(config_file)
 
-    service = cal.authenticate()
-    wh = WorkHours(service, config, args)
 
-    args.func(args, service, wh)
-    wh.day_summary()
+def run_command(args, service, config, session):
+    """Run the command of args and the day summary on an open session"""
+    if args.func is team:
+        # The members have their own calendars and hours
+        wh = None
+    else:
+        wh = WorkHours(service, config, args, session)
+    if args.record or args.replay:
+        # A cassette holds the requests of the command only
+        args.journal_replayed = False
+    else:
+        replay_journal(service, args)
+    with stats.phase("command"):
+        args.func(args, service, wh)
+    if wh is not None and getattr(args, "format", "text") == "text":
+        with stats.phase("day summary"):
+            wh.day_summary()
+    session.close()
+
+
+def run(parser, args):
+    config = None if args.func is team else load_config()
+
+    if args.refresh_calendars:
+        cal.invalidate_calendar_ids()
+
+    if args.offline:
+        if args.func not in (start, stop, create):
+            parser.error("only start, stop and create can run offline")
+        args.func(args, None, WorkHours(None, config, args))
+        return
+
+    with stats.phase("authenticate"):
+        if args.replay:
+            transport = ReplayHttp.load(
+                args.replay, args.latency / 1000, args.page_size
+            )
+            service = cal.build_service(transport)
+        elif args.record:
+            transport = None
+
+            def record(http):
+                nonlocal transport
+                transport = RecordingHttp(http, args.record)
+                return transport
+
+            service = cal.authenticate(wrap_http=record)
+        else:
+            transport = None
+            service = cal.authenticate()
+    session = Session(service, args.calendar, workers=args.parallel)
+
+    try:
+        run_command(args, service, config, session)
+    finally:
+        if transport is not None:
+            print("Round trips: {}".format(transport.round_trips), file=sys.stderr)
+        if args.record:
+            transport.save()
+
+
+def report_stats(args, seconds):
+    data = dict(stats.snapshot(), seconds=round(seconds, 6), argv=sys.argv[1:])
+    if args.profile:
+        print("\n" + stats.format_report(data), file=sys.stderr)
+        print("{:<24} {:>10.4f}".format("total seconds", seconds), file=sys.stderr)
+    if args.stats:
+        with open(args.stats, "w") as stats_file:
+            json.dump(data, stats_file, indent=2)
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    profiler = None
+    if args.cprofile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start_time = time.perf_counter()
+    try:
+        run(parser, args)
+    except BrokenPipeError:
+        # The reader of the report stopped early, like head does
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        seconds = time.perf_counter() - start_time
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        report_stats(args, seconds)
 
 
 if __name__ == "__main__":
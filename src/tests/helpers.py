@@ -0,0 +1,51 @@
+"""Fixtures shared by the tests that run on the fake Calendar service"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+from benchmarks.synthetic import EXPECTED
+from google_calendar import cache, cal
+from google_calendar.session import Session
+
+CONFIG = {"expected": EXPECTED}
+
+
+class CalendarTestCase(unittest.TestCase):
+    """A test with a cache folder of its own, in self.directory
+
+    Tests that run commands set self.service to a FakeService. What the
+    last command printed stays in self.output, even if it exited.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = mock.patch.object(cache, "CACHE_DIR", directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cal.invalidate_calendar_ids()
+        self.addCleanup(cal.invalidate_calendar_ids)
+
+    def run_command(self, *argv, config=CONFIG):
+        """Run a command line like main does, return what it prints"""
+        args = main.build_parser().parse_args(argv)
+        self.output = io.StringIO()
+        with contextlib.redirect_stdout(self.output):
+            session = Session(self.service, args.calendar)
+            main.run_command(args, self.service, config, session)
+        return self.output.getvalue()
+
+    def run_function(self, *argv, config=CONFIG):
+        """Run the function of a command alone, without the journal replay
+        and the day summary, return what it prints"""
+        args = main.build_parser().parse_args(argv)
+        wh = main.WorkHours(self.service, config, args)
+        self.output = io.StringIO()
+        with contextlib.redirect_stdout(self.output):
+            args.func(args, self.service, wh)
+        return self.output.getvalue()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+from google_calendar import cache
+from google_calendar.cache import EventCache
+
+
+def make_event(id, start, end, summary="WORK"):
+    return {
+        "id": id,
+        "summary": summary,
+        "start": {"dateTime": start, "timeZone": "UTC"},
+        "end": {"dateTime": end, "timeZone": "UTC"},
+    }
+
+
+class TestEventCache(unittest.TestCase):
+    def test_apply_changes(self):
+
+        """
+        Test that inserts, updates and cancellations are applied to the cache
+        """
+
+        cache = EventCache("unused")
+        changed = cache.apply(
+            [
+                make_event(
+                    "a", "2020-10-14T10:00:00+02:00", "2020-10-14T12:00:00+02:00"
+                ),
+                make_event(
+                    "b", "2020-10-13T10:00:00+02:00", "2020-10-13T12:00:00+02:00"
+                ),
+            ]
+        )
+        self.assertEqual(changed, ["a", "b"])
+        self.assertEqual([e["id"] for e in cache.sorted_events()], ["b", "a"])
+
+        changed = cache.apply(
+            [
+                make_event(
+                    "a", "2020-10-12T10:00:00+02:00", "2020-10-12T12:00:00+02:00", "X"
+                ),
+                {"id": "b", "status": "cancelled"},
+                {"id": "unknown", "status": "cancelled"},
+            ]
+        )
+        self.assertEqual(changed, ["a", "b"])
+        self.assertEqual([e["summary"] for e in cache.sorted_events()], ["X"])
+
+    def test_sort_mixed_offsets_and_dates(self):
+
+        """
+        Test that events are ordered by instant, not by their ISO strings
+        """
+
+        cache = EventCache("unused")
+        cache.apply(
+            [
+                make_event(
+                    "a", "2020-10-14T10:00:00+02:00", "2020-10-14T11:00:00+02:00"
+                ),
+                make_event("b", "2020-10-14T09:30:00Z", "2020-10-14T10:00:00Z"),
+                {
+                    "id": "c",
+                    "summary": "VACATION",
+                    "start": {"date": "2020-10-14"},
+                    "end": {"date": "2020-10-15"},
+                },
+            ]
+        )
+        self.assertEqual([e["id"] for e in cache.sorted_events()], ["c", "a", "b"])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.object(cache, "CACHE_DIR", directory):
+                event_cache = EventCache.load("work@group.calendar.google.com")
+                self.assertIsNone(event_cache.sync_token)
+                event_cache.sync_token = "token-1"
+                event_cache.apply(
+                    [make_event("a", "2020-10-14T10:00:00Z", "2020-10-14T11:00:00Z")]
+                )
+                event_cache.save()
+
+                loaded = EventCache.load("work@group.calendar.google.com")
+                self.assertEqual(loaded.sync_token, "token-1")
+                self.assertEqual(list(loaded.events), ["a"])
+
+    def test_touched_dates(self):
+
+        """
+        Test that the start dates of old and new versions are reported once
+        """
+
+        event_cache = EventCache("unused", touched=[])
+        event_cache.apply(
+            [make_event("a", "2020-10-14T10:00:00Z", "2020-10-14T11:00:00Z")]
+        )
+        event_cache.take_touched()
+        event_cache.apply(
+            [
+                make_event("a", "2020-10-16T10:00:00Z", "2020-10-16T11:00:00Z"),
+                make_event("b", "2020-10-18T10:00:00Z", "2020-10-18T11:00:00Z"),
+            ]
+        )
+        event_cache.apply([{"id": "b", "status": "cancelled"}])
+        self.assertEqual(
+            event_cache.take_touched(),
+            {
+                datetime.date(2020, 10, 14),
+                datetime.date(2020, 10, 16),
+                datetime.date(2020, 10, 18),
+            },
+        )
+        self.assertEqual(event_cache.take_touched(), set())
+
+        event_cache.clear()
+        self.assertIsNone(event_cache.take_touched())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+import datetime
+import unittest
+from unittest import mock
+
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import generate_events
+from google_calendar import cal
+from google_calendar.cache import EventCache
+from google_calendar.session import Session
+from tests.helpers import CalendarTestCase
+
+
+class TestCalendarId(CalendarTestCase):
+    def test_resolve_once(self):
+
+        """
+        Test that the calendar list is fetched once and kept on disk
+        """
+
+        service = FakeService()
+        service.add_calendar("Private")
+        for i in range(100):
+            service.add_calendar("Other {}".format(i))
+        work_id = service.add_calendar("Work Hours")
+        self.assertEqual(cal.get_calendar_id(service, "Work Hours"), work_id)
+        self.assertEqual(
+            cal.get_calendar_id(service, "Private"), "private@group.calendar.google.com"
+        )
+        self.assertEqual(service.requests["calendarList.list"], 2)
+
+        # A new process reads the mapping from disk
+        cal._calendar_ids.clear()
+        self.assertEqual(cal.get_calendar_id(service, "Work Hours"), work_id)
+        self.assertEqual(service.requests["calendarList.list"], 2)
+
+        cal.invalidate_calendar_ids()
+        self.assertEqual(cal.get_calendar_id(service, "Work Hours"), work_id)
+        self.assertEqual(service.requests["calendarList.list"], 4)
+
+    def test_raw_calendar_id(self):
+        service = FakeService()
+        self.assertEqual(cal.get_calendar_id(service, "work@x"), "work@x")
+        self.assertEqual(cal.get_calendar_id(service, "primary"), "primary")
+        self.assertEqual(service.requests["calendarList.list"], 0)
+
+
+class TestBatch(unittest.TestCase):
+    def test_execute_batch(self):
+
+        """
+        Test that requests are sent in chunks and results reported per key
+        """
+
+        service = FakeService()
+        calendar_id = service.add_calendar("Work Hours")
+        for i in range(7):
+            if i != 3:
+                service.store(calendar_id, {"id": str(i)})
+        requests = [
+            (str(i), service.events().get(calendarId=calendar_id, eventId=str(i)))
+            for i in range(7)
+        ]
+        results = cal.execute_batch(service, requests, batch_size=3)
+        self.assertEqual(service.requests["batch"], 3)
+        self.assertEqual(service.requests["events.get (batched)"], 7)
+        self.assertEqual(len(results), 7)
+        self.assertEqual(results["0"][0]["id"], "0")
+        self.assertIsNone(results["0"][1])
+        self.assertIsNone(results["3"][0])
+        self.assertEqual(results["3"][1].resp.status, 404)
+
+
+class TestIterEvents(CalendarTestCase):
+    def test_pages_fetched_lazily(self):
+
+        """
+        Test that the next page is only fetched when the events are consumed
+        """
+
+        service = FakeService()
+        calendar_id = service.add_calendar(
+            "Work Hours",
+            [
+                {"id": id, "start": {"dateTime": start}, "end": {"dateTime": start}}
+                for id, start in (
+                    ("a", "2020-01-06T08:00:00+00:00"),
+                    ("b", "2020-01-07T08:00:00+00:00"),
+                    ("c", "2020-01-08T08:00:00+00:00"),
+                )
+            ],
+        )
+        with mock.patch.object(cal, "MAX_PAGE_SIZE", 2):
+            events = cal.iter_events(
+                service,
+                calendar_id,
+                datetime.date(2020, 1, 1),
+                datetime.date(2020, 1, 31),
+            )
+            self.assertEqual(next(events)["id"], "a")
+            self.assertEqual(service.requests["events.list"], 1)
+            self.assertEqual([e["id"] for e in events], ["b", "c"])
+            self.assertEqual(service.requests["events.list"], 2)
+
+    def test_window(self):
+        def event(id, start):
+            return {"id": id, "start": {"dateTime": start}, "end": {"dateTime": start}}
+
+        day = datetime.date(2020, 1, 2)
+        service = FakeService(
+            {
+                "Work Hours": [
+                    event("before", "2020-01-01T23:00:00+00:00"),
+                    # Jan 1 in UTC, but dated in its own offset
+                    event("offset", "2020-01-02T00:30:00+02:00"),
+                    event("on", "2020-01-02T08:00:00+00:00"),
+                    event("late", "2020-01-02T23:00:00-05:00"),
+                    event("after", "2020-01-03T08:00:00+00:00"),
+                    event("far", "2020-01-09T08:00:00+00:00"),
+                ]
+            }
+        )
+        session = Session(service, "Work Hours")
+        events = session.events_between(day, day)
+        self.assertEqual([e.id for e in events], ["offset", "on", "late"])
+        # The server is asked for the padded window only
+        fetched = [
+            e["id"] for e in cal.iter_events(service, session.calendar_id, day, day)
+        ]
+        self.assertNotIn("far", fetched)
+
+        service.reset_counters()
+        self.assertEqual(session.events_between(day, day - datetime.timedelta(1)), [])
+        self.assertEqual(
+            [
+                *cal.iter_events(
+                    service, session.calendar_id, day, datetime.date(2019, 1, 1)
+                )
+            ],
+            [],
+        )
+        self.assertEqual(dict(service.requests), {})
+
+
+class TestShards(unittest.TestCase):
+    def test_quarter_shards(self):
+        shards = list(
+            cal._quarter_shards(datetime.date(2019, 11, 20), datetime.date(2020, 7, 1))
+        )
+        self.assertEqual(
+            shards,
+            [
+                (datetime.date(2019, 11, 20), datetime.date(2019, 12, 31)),
+                (datetime.date(2020, 1, 1), datetime.date(2020, 3, 31)),
+                (datetime.date(2020, 4, 1), datetime.date(2020, 6, 30)),
+                (datetime.date(2020, 7, 1), datetime.date(2020, 7, 1)),
+            ],
+        )
+
+    def test_open_ended_shards(self):
+        today = datetime.date.today()
+        shards = list(cal._quarter_shards(today - datetime.timedelta(days=400), None))
+        self.assertEqual(shards[-1][1], None)
+        self.assertLessEqual(shards[-1][0], today)
+        self.assertEqual(len(shards), len(set(shards)))
+
+
+class TestSyncEvents(CalendarTestCase):
+    def test_delta_sync(self):
+
+        """
+        Test that later syncs only fetch changes and that an expired token
+        triggers a full resync
+        """
+
+        events = generate_events(4, end_date=datetime.date(2020, 12, 31))
+        service = FakeService()
+        calendar_id = service.add_calendar("Work Hours", events)
+
+        event_cache = EventCache.load(calendar_id)
+        changed = cal.sync_events(service, calendar_id, event_cache)
+        self.assertEqual(len(changed), len(events))
+        full_sync_requests = service.requests["events.list"]
+        self.assertGreater(full_sync_requests, 1)
+
+        service.reset_counters()
+        service.events().delete(calendarId=calendar_id, eventId="ongoing").execute()
+        service.events().patch(
+            calendarId=calendar_id, eventId=events[0]["id"], body={"summary": "X"}
+        ).execute()
+        event_cache = EventCache.load(calendar_id)
+        changed = cal.sync_events(service, calendar_id, event_cache)
+        self.assertEqual(sorted(changed), sorted(["ongoing", events[0]["id"]]))
+        self.assertEqual(service.requests["events.list"], 1)
+        self.assertNotIn("ongoing", event_cache.events)
+        self.assertEqual(event_cache.events[events[0]["id"]]["summary"], "X")
+
+        service.reset_counters()
+        service.expire_sync_tokens()
+        event_cache = EventCache.load(calendar_id)
+        cal.sync_events(service, calendar_id, event_cache)
+        self.assertEqual(service.requests["events.list"], full_sync_requests + 1)
+        self.assertEqual(len(event_cache.events), len(events) - 1)
+
+    def test_parallel_matches_serial(self):
+        events = generate_events(2, end_date=datetime.date(2020, 12, 31))
+        service = FakeService()
+        calendar_id = service.add_calendar("Work Hours", events)
+        serial = cal.get_events(service, calendar_id)
+        parallel = cal.get_events(service, calendar_id, workers=3)
+        self.assertEqual(len(parallel), len(events))
+        self.assertEqual([e["id"] for e in parallel], [e["id"] for e in serial])
+
+
+if __name__ == "__main__":
+    unittest.main()
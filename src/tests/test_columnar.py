@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import datetime
+import importlib.util
+import os
+import unittest
+
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import generate_events
+from tests.helpers import CalendarTestCase
+from utils.event import from_api_items
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+
+@unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+class TestColumnarSummary(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.events = generate_events(2, end_date=datetime.date(2024, 5, 20))
+        self.service = FakeService({"Work Hours": self.events})
+
+    def summary(self, *argv):
+        return self.run_function("summary", *argv)
+
+    def test_matches_summary(self):
+        for flags in (
+            [],
+            ["-d", "-w", "-m"],
+            ["-s", "2023-02-01", "-e", "2023-09-30", "-w", "-m"],
+            ["-s", "2030-01-01"],
+        ):
+            with self.subTest(flags=flags):
+                self.assertEqual(
+                    self.summary("--engine", "numpy", *flags), self.summary(*flags)
+                )
+
+    def test_export(self):
+        from utils.columnar import EventColumns
+
+        path = os.path.join(self.directory, "events.npz")
+        self.summary("--engine", "numpy", "--export", path)
+        columns = EventColumns.load(path)
+        expected = EventColumns.from_events(from_api_items(self.events))
+        self.assertEqual(len(columns), len(self.events))
+        self.assertEqual(sorted(columns.start), sorted(expected.start))
+        self.assertEqual(set(columns.summaries), set(expected.summaries))
+
+
+if __name__ == "__main__":
+    unittest.main()
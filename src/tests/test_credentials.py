@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+import datetime
+import json
+import os
+import stat
+import tempfile
+import threading
+import unittest
+
+import httplib2
+
+from google_calendar.credentials import CredentialManager, ManagedHttp, _utcnow
+from google_calendar.transport import HttpPool
+
+
+class FakeCredentials:
+    """Credentials whose refresh hands out token-1, token-2, ..."""
+
+    def __init__(self, expires_in):
+        self.token = "token-0"
+        self.refresh_token = "refresh"
+        self.expiry = _utcnow() + expires_in
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = "token-{}".format(self.refreshes)
+        self.expiry = _utcnow() + datetime.timedelta(hours=1)
+
+    def apply(self, headers, token=None):
+        headers["authorization"] = "Bearer " + (token or self.token)
+
+    def to_json(self):
+        return json.dumps({"token": self.token, "refresh_token": self.refresh_token})
+
+
+class TokenHttp:
+    """Reject the requests made with the tokens in rejected"""
+
+    def __init__(self, rejected=()):
+        self.rejected = set(rejected)
+        self.seen = []
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        token = headers["authorization"].split()[1]
+        self.seen.append(token)
+        status = 401 if token in self.rejected else 200
+        return httplib2.Response({"status": status}), b"{}"
+
+
+class TestCredentials(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "token.json")
+
+    def manager(self, expires_in):
+        return CredentialManager(FakeCredentials(expires_in), None, self.path)
+
+    def test_refresh_ahead_of_expiry(self):
+        manager = self.manager(datetime.timedelta(hours=1))
+        manager.fresh()
+        self.assertEqual(manager.credentials.refreshes, 0)
+
+        manager = self.manager(datetime.timedelta(minutes=1))
+        manager.fresh()
+        manager.fresh()
+        self.assertEqual(manager.credentials.refreshes, 1)
+        with open(self.path, "r") as token_file:
+            self.assertEqual(json.load(token_file)["token"], "token-1")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_background_refresh(self):
+        manager = self.manager(datetime.timedelta(0))
+        manager.start()
+        self.addCleanup(manager.stop)
+        for _ in range(100):
+            if manager.credentials.refreshes:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(manager.credentials.token, "token-1")
+
+    def test_retry_rejected_token(self):
+        manager = self.manager(datetime.timedelta(hours=1))
+        http = TokenHttp(rejected=["token-0"])
+        response, _ = ManagedHttp(manager, http).request("https://example.com")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(http.seen, ["token-0", "token-1"])
+
+        # A token rejected by an earlier request is not refreshed again
+        manager.refresh(rejected="token-0")
+        self.assertEqual(manager.credentials.refreshes, 1)
+
+    def test_store(self):
+        from google.oauth2.credentials import Credentials
+
+        self.assertIsNone(CredentialManager.load(None, [], self.path))
+        credentials = Credentials(
+            "access",
+            refresh_token="refresh",
+            token_uri="https://oauth2.googleapis.com/token",
+            client_id="id",
+            client_secret="secret",
+        )
+        CredentialManager(credentials, None, self.path).save()
+        manager = CredentialManager.load(None, [], self.path)
+        self.assertEqual(manager.credentials.token, "access")
+        self.assertEqual(manager.credentials.refresh_token, "refresh")
+
+
+class TestHttpPool(unittest.TestCase):
+    def test_reuse(self):
+        created = []
+        barrier = threading.Barrier(3)
+
+        class BlockingHttp:
+            def __init__(self):
+                created.append(self)
+
+            def request(self, uri, **kwargs):
+                if uri == "wait":
+                    barrier.wait(timeout=5)
+                return httplib2.Response({"status": 200}), b""
+
+        pool = HttpPool(BlockingHttp)
+        pool.request("first")
+        pool.request("second")
+        self.assertEqual(len(created), 1)
+
+        # Concurrent requests borrow different transports
+        threads = [threading.Thread(target=pool.request, args=("wait",)) for _ in "ab"]
+        for thread in threads:
+            thread.start()
+        barrier.wait(timeout=5)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(created), 2)
+        pool.request("third")
+        self.assertEqual(len(created), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
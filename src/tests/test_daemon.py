@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import datetime
+import os
+import socket
+import threading
+import time
+import unittest
+
+import daemon
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import EXPECTED, generate_events
+from tests.helpers import CalendarTestCase
+
+
+class TestDaemon(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = FakeService({"Work Hours": generate_events(1)})
+        self.path = os.path.join(self.directory, daemon.SOCKET_NAME)
+
+    def start(self, refresh_interval):
+        self.daemon = daemon.Daemon(
+            self.service, {"expected": EXPECTED}, self.path, refresh_interval
+        )
+        thread = threading.Thread(target=self.daemon.serve, args=("Work Hours",))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(daemon.send, self.daemon.path, {"stop": True})
+        while not os.path.exists(self.daemon.path):
+            time.sleep(0.01)
+
+    def run_command(self, *argv):
+        answer = daemon.send(self.daemon.path, {"argv": argv})
+        return answer["status"], answer["output"]
+
+    def test_commands_use_warm_events(self):
+        self.start(refresh_interval=60)
+        self.service.reset_counters()
+        status, output = self.run_command("-f", "stop")
+        self.assertEqual(status, 0, output)
+        self.assertIn("Total time worked today", output)
+        self.assertEqual(dict(self.service.requests), {"events.patch": 1})
+
+        status, output = self.run_command("nonsense")
+        self.assertEqual(status, 2)
+        self.assertIn("invalid choice", output)
+
+    def test_bad_requests(self):
+        self.start(refresh_interval=60)
+        for request in (b"{not json", b"[]", b'{"other": 1}'):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.connect(self.daemon.path)
+                connection.sendall(request)
+                connection.shutdown(socket.SHUT_WR)
+                answer = daemon._receive(connection)
+            self.assertEqual(answer["status"], 2)
+            self.assertIn("Bad request", answer["output"])
+
+        # A client hanging up before the answer
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self.daemon.path)
+            connection.sendall(b'{"argv": ["-f", "stop"]}')
+        status, output = self.run_command("list")
+        self.assertEqual(status, 0, output)
+
+    def test_background_refresh(self):
+        self.start(refresh_interval=0.05)
+        today = datetime.date.today()
+        calendar_id = self.daemon.session("Work Hours").calendar_id
+        event = dict(generate_events(1)[-1], id="added", summary="ADDED")
+        self.service.store(calendar_id, event)
+        for _ in range(100):
+            with self.daemon.lock:
+                ids = [
+                    event.id
+                    for event in self.daemon.session("Work Hours").events_between(
+                        today, today
+                    )
+                ]
+            if "added" in ids:
+                break
+            time.sleep(0.02)
+        self.assertIn("added", ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
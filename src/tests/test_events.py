@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
+import datetime
 import unittest
 
 from utils import event_utils
+from utils.event import Event, from_api_items
 
 
 class TestEvents(unittest.TestCase):
@@ -64,6 +66,105 @@ class TestEvents(unittest.TestCase):
             event_utils.graph(events), "[]        WWWWWWWWWWWWWWWW            []"
         )
 
+    def test_event_graph_days(self):
+
+        """
+        Test rendering several days at once, including events past midnight
+        """
+
+        events = from_api_items(
+            [
+                {
+                    "summary": "WORK",
+                    "start": {"dateTime": "2020-10-14T22:00:00+02:00"},
+                    "end": {"dateTime": "2020-10-15T02:00:00+02:00"},
+                },
+                {
+                    "summary": "JOUR",
+                    "start": {"dateTime": "2020-10-16T01:00:00+02:00"},
+                    "end": {"dateTime": "2020-10-16T03:00:00+02:00"},
+                },
+            ]
+        )
+        graphs = event_utils.graph_days(
+            event_utils.index_by_date(events),
+            [datetime.date(2020, 10, d) for d in (14, 15, 16)],
+            start=datetime.time(0, 0, 0),
+            end=datetime.time(4, 0, 0),
+            resolution=datetime.timedelta(hours=1),
+        )
+        self.assertEqual(graphs, ["[]WW  []", "[]    []", "[] JJ []"])
+
+    def test_index_by_date(self):
+
+        """
+        Test that events are bucketed by start date in start order
+        """
+
+        events = [
+            {
+                "id": "late",
+                "summary": "WORK",
+                "start": {"dateTime": "2020-10-14T14:00:00+02:00", "timeZone": "UTC"},
+                "end": {"dateTime": "2020-10-14T15:00:00+02:00", "timeZone": "UTC"},
+            },
+            {
+                "id": "other day",
+                "summary": "WORK",
+                "start": {"dateTime": "2020-10-15T08:00:00+02:00", "timeZone": "UTC"},
+                "end": {"dateTime": "2020-10-15T10:00:00+02:00", "timeZone": "UTC"},
+            },
+            {
+                "id": "early",
+                "summary": "WORK",
+                "start": {"dateTime": "2020-10-14T08:00:00+02:00", "timeZone": "UTC"},
+                "end": {"dateTime": "2020-10-14T10:00:00+02:00", "timeZone": "UTC"},
+            },
+        ]
+        index = event_utils.index_by_date(from_api_items(events))
+        self.assertEqual(
+            [e.id for e in index[datetime.date(2020, 10, 14)]], ["early", "late"]
+        )
+        self.assertEqual(
+            [e.id for e in index[datetime.date(2020, 10, 15)]], ["other day"]
+        )
+        self.assertNotIn(datetime.date(2020, 10, 16), index)
+
+    def test_event_from_api(self):
+
+        """
+        Test parsing of timed, UTC and all-day events
+        """
+
+        event = Event.from_api(
+            {
+                "id": "abc",
+                "summary": "WORK",
+                "description": "Office",
+                "start": {"dateTime": "2020-10-14T10:00:00+02:00", "timeZone": "UTC"},
+                "end": {"dateTime": "2020-10-14T12:30:00Z", "timeZone": "UTC"},
+            }
+        )
+        self.assertEqual(event.id, "abc")
+        self.assertEqual(event.description, "Office")
+        self.assertEqual(event.location, "")
+        self.assertFalse(event.all_day)
+        self.assertEqual(event.start.time(), datetime.time(10, 0))
+        self.assertEqual(event.duration, datetime.timedelta(hours=4, minutes=30))
+
+        event = Event.from_api(
+            {
+                "id": "def",
+                "summary": "VACATION",
+                "start": {"date": "2020-10-14"},
+                "end": {"date": "2020-10-15"},
+            }
+        )
+        self.assertTrue(event.all_day)
+        self.assertEqual(event.start.date(), datetime.date(2020, 10, 14))
+        self.assertEqual(event.duration, datetime.timedelta(days=1))
+        self.assertIs(Event.coerce(event), event)
+
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
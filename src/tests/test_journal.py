@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+from benchmarks.fake_calendar import FakeService
+from google_calendar.journal import Journal, replay
+from tests.helpers import CalendarTestCase
+
+
+def time(hour):
+    return {"dateTime": "2020-10-14T{:02d}:00:00+00:00".format(hour)}
+
+
+class TestJournal(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.journal = Journal(os.path.join(self.directory, "journal.jsonl"))
+        self.service = FakeService()
+        self.calendar_id = self.service.add_calendar("Work Hours")
+
+    def test_replay(self):
+
+        """
+        Test replaying inserts, patches and conflicting patches
+        """
+
+        for event in (
+            {"id": "open", "start": time(8), "end": time(8)},
+            {"id": "stopped", "start": time(8), "end": time(9)},
+        ):
+            self.service.store(self.calendar_id, event)
+        events = self.service.events_by_calendar[self.calendar_id]
+        started = self.journal.insert(
+            "Work Hours", {"summary": "WORK", "start": time(10), "end": time(10)}
+        )
+        self.journal.patch("Work Hours", started, {"end": time(12)}, expect_open=True)
+        self.journal.patch("Work Hours", "open", {"end": time(9)}, expect_open=True)
+        self.journal.patch("Work Hours", "stopped", {"end": time(11)}, expect_open=True)
+        self.journal.patch("Work Hours", "gone", {"summary": "X"})
+
+        outcomes = [outcome for _, outcome in replay(self.service, self.journal)]
+        self.assertEqual(
+            outcomes,
+            [
+                "inserted",
+                "patched",
+                "patched",
+                "conflict: event was already stopped",
+                "conflict: event was deleted",
+            ],
+        )
+        self.assertEqual(events[started]["end"], time(12))
+        self.assertEqual(events["open"]["end"], time(9))
+        self.assertEqual(events["stopped"]["end"], time(9))
+        self.assertEqual(self.journal.entries(), [])
+
+        # Replaying an insert that reached the server is not a failure
+        self.journal.append(
+            {
+                "op": "insert",
+                "calendar": "Work Hours",
+                "id": started,
+                "body": {"id": started},
+            }
+        )
+        self.assertEqual(
+            [outcome for _, outcome in replay(self.service, self.journal)], ["inserted"]
+        )
+
+    def test_unknown_calendar(self):
+        # An entry for a calendar that does not exist does not block the others
+        self.journal.insert("Typo", {"start": time(8), "end": time(8)})
+        self.journal.patch("Typo", "other", {"end": time(9)})
+        started = self.journal.insert(
+            "Work Hours", {"start": time(10), "end": time(10)}
+        )
+        outcomes = [outcome for _, outcome in replay(self.service, self.journal)]
+        self.assertEqual(
+            outcomes,
+            ["failed: unknown calendar", "failed: unknown calendar", "inserted"],
+        )
+        self.assertIn(started, self.service.events_by_calendar[self.calendar_id])
+        self.assertEqual(
+            [entry["calendar"] for entry in self.journal.entries()], ["Typo", "Typo"]
+        )
+
+    def test_pending_events(self):
+        started = self.journal.insert(
+            "primary", {"summary": "WORK", "start": time(10), "end": time(10)}
+        )
+        self.journal.patch("primary", started, {"end": time(12)})
+        self.journal.patch("primary", "server", {"end": time(9)})
+        self.journal.patch("other", "server", {"end": time(7)})
+        inserted, patches = self.journal.pending_events("primary")
+        self.assertEqual(inserted[started]["end"], time(12))
+        self.assertEqual(inserted[started]["id"], started)
+        self.assertEqual(patches, {"server": {"end": time(9)}})
+
+
+if __name__ == "__main__":
+    unittest.main()
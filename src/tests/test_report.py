@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+import contextlib
+import csv
+import datetime
+import io
+import json
+import unittest
+
+import main
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import generate_events
+from google_calendar.journal import Journal
+from tests.helpers import CalendarTestCase
+from utils import report
+from utils.event import Event
+
+SATURDAY = datetime.date(2024, 3, 2)
+
+
+class TestReport(unittest.TestCase):
+    def test_text_day(self):
+        stream = io.StringIO()
+        report.TextWriter(stream).day(SATURDAY, 3600.5, -1800, "[]x[]", 7200)
+        # As print of the fields separated by spaces
+        self.assertEqual(
+            stream.getvalue(),
+            "\033[91m 2024-03-02 01:00:00 -00:30:00   []x[] \033[0m +02:00:00  \n",
+        )
+
+    def test_rows(self):
+        start = datetime.datetime(2024, 3, 1, 8, tzinfo=datetime.timezone.utc)
+        event = Event("a", "WORK", start, start + datetime.timedelta(hours=2))
+        stream = io.StringIO()
+        out = report.writer("csv", report.EVENT_FIELDS, stream)
+        out.event(event)
+        out.close()
+        rows = [*csv.DictReader(io.StringIO(stream.getvalue()))]
+        self.assertEqual(rows[0]["seconds"], "7200.0")
+        self.assertEqual(rows[0]["date"], "2024-03-01")
+
+        stream = io.StringIO()
+        out = report.writer("jsonl", report.SUMMARY_FIELDS, stream)
+        out.week(datetime.date(2024, 1, 8), 60.0)
+        out.month(datetime.date(2024, 2, 1), -60.0)
+        self.assertEqual(
+            [json.loads(line)["period"] for line in stream.getvalue().splitlines()],
+            ["2024-W01", "2024-01"],
+        )
+
+
+class TestSummaryFormats(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = FakeService({"Work Hours": generate_events(1, seed=1)})
+
+    def test_jsonl_matches_text(self):
+        text = self.run_command("summary", "-d")
+        rows = [
+            json.loads(line)
+            for line in self.run_command(
+                "summary", "-d", "--format", "jsonl"
+            ).splitlines()
+        ]
+        days = [row for row in rows if row["type"] == "day"]
+        self.assertEqual(len(days), text.count("\n") - 3)
+        self.assertEqual(rows[-1]["type"], "total")
+        self.assertEqual(rows[-1]["balance"], days[-1]["total"])
+        self.assertIn(
+            "Total: " + main.event_utils.format_time_diff(rows[-1]["balance"]), text
+        )
+
+    def test_jsonl_after_journal(self):
+        Journal.load().insert(
+            "Work Hours", dict(generate_events(1, seed=2)[-1], summary="OFFLINE")
+        )
+        errors = io.StringIO()
+        with contextlib.redirect_stderr(errors):
+            output = self.run_command("list", "--format", "jsonl")
+        self.assertIn("Journal insert", errors.getvalue())
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(rows[-1]["summary"], "OFFLINE")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+import datetime
+import unittest
+
+from utils.rollup import Rollups
+
+
+def day(n):
+    return datetime.date(2020, 10, 1) + datetime.timedelta(days=n)
+
+
+class TestRollups(unittest.TestCase):
+    def test_checkpoint(self):
+
+        """
+        Test that closing days folds them into the checkpoint balance and that
+        changing a closed day adjusts it
+        """
+
+        rollups = Rollups()
+        rollups.reset("rules", day(0))
+        self.assertEqual(rollups.open_dates(day(4)), [day(i) for i in range(5)])
+        for i in range(5):
+            rollups.set_day(day(i), 3600.0 * i, 7200.0)
+
+        rollups.close(day(2))
+        self.assertEqual(rollups.closed_until, day(2))
+        self.assertEqual(rollups.closed_balance, (0 + 3600 + 7200) - 3 * 7200.0)
+        self.assertEqual(rollups.open_dates(day(4)), [day(3), day(4)])
+
+        rollups.set_day(day(1), 7200.0, 7200.0)
+        self.assertEqual(rollups.closed_balance, (0 + 7200 + 7200) - 3 * 7200.0)
+
+        loaded = Rollups(rollups.to_json())
+        self.assertTrue(loaded.matches("rules", day(0)))
+        self.assertFalse(loaded.matches("other rules", day(0)))
+        self.assertEqual(loaded.closed_until, day(2))
+        self.assertEqual(loaded.closed_balance, rollups.closed_balance)
+        self.assertEqual(loaded.days, rollups.days)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import datetime
+import unittest
+
+from utils.schedule import DEFAULT_PLANNED, Schedule
+
+EXPECTED = [
+    {"startdate": "2019-12-01", "hours": [7.2, 7.2, 7.2, 7.2, 7.2, 0.0, 0.0]},
+    {"startdate": "2019-09-05", "hours": [6.4, 6.4, 6.4, 6.4, 6.4, 0.0, 0.0]},
+]
+
+
+class TestSchedule(unittest.TestCase):
+    def test_planned(self):
+
+        """
+        Test that the latest entry before the date applies, in any file order
+        """
+
+        for expected in (EXPECTED, EXPECTED[::-1]):
+            schedule = Schedule(expected)
+            # Monday before, on and after the first startdate
+            self.assertEqual(
+                schedule.planned(datetime.date(2019, 9, 2)), DEFAULT_PLANNED
+            )
+            self.assertEqual(
+                schedule.planned(datetime.date(2019, 9, 5)), DEFAULT_PLANNED
+            )
+            self.assertEqual(
+                schedule.planned(datetime.date(2019, 9, 6)),
+                datetime.timedelta(hours=6.4),
+            )
+            self.assertEqual(
+                schedule.planned(datetime.date(2019, 12, 2)),
+                datetime.timedelta(hours=7.2),
+            )
+            # Sunday
+            self.assertEqual(
+                schedule.planned(datetime.date(2019, 12, 8)), datetime.timedelta()
+            )
+
+    def test_planned_range(self):
+
+        """
+        Test that the range matches day by day lookups
+        """
+
+        schedule = Schedule(EXPECTED)
+        start_date = datetime.date(2019, 8, 1)
+        end_date = datetime.date(2020, 2, 1)
+        planned = schedule.planned_range(start_date, end_date)
+        self.assertEqual(len(planned), (end_date - start_date).days + 1)
+        for i, value in enumerate(planned):
+            date = start_date + datetime.timedelta(days=i)
+            self.assertEqual(value, schedule.planned(date))
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            Schedule([{"startdate": "2019-13-01", "hours": [1] * 7}])
+        with self.assertRaises(ValueError):
+            Schedule([{"startdate": "2019-12-01", "hours": [1] * 5}])
+        with self.assertRaises(ValueError):
+            Schedule(EXPECTED + EXPECTED[:1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+import contextlib
+import datetime
+import io
+import unittest
+from unittest import mock
+
+import main
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import EXPECTED, generate_events
+from google_calendar import cache
+from google_calendar.journal import Journal
+from google_calendar.session import Session
+from tests.helpers import CalendarTestCase
+from utils import stats
+
+END_DATE = datetime.date(2025, 3, 14)
+
+
+class TestSession(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = FakeService(
+            {"Work Hours": generate_events(1, end_date=END_DATE)}
+        )
+
+    def requests(self):
+        requests = sum(self.service.requests.values())
+        self.service.reset_counters()
+        return requests
+
+    def test_loads_once(self):
+        session = Session(self.service, "Work Hours")
+        session.events()
+        self.requests()
+        session.load()
+        on_day = session.events_between(END_DATE, END_DATE)
+        self.assertEqual(self.requests(), 0)
+        self.assertEqual(on_day[-1].id, "ongoing")
+
+    def test_warm_rollups(self):
+        args = main.build_parser().parse_args(["summary"])
+        main.WorkHours(self.service, {"expected": EXPECTED}, args).update_rollups()
+
+        stats.reset()
+        self.addCleanup(stats.reset)
+        wh = main.WorkHours(self.service, {"expected": EXPECTED}, args)
+        with mock.patch.object(cache, "save_json") as save_cache, mock.patch.object(
+            main, "save_json"
+        ) as save_rollups:
+            wh.update_rollups()
+        # Nothing changed, nothing is written and only open days are parsed
+        save_cache.assert_not_called()
+        save_rollups.assert_not_called()
+        parsed = stats.snapshot()["counters"].get("events parsed", 0)
+        self.assertLess(parsed, len(wh.session.cache.events) / 3)
+
+    def test_negative_horizon(self):
+        parser = main.build_parser()
+        self.assertEqual(parser.parse_args(["summary", "--horizon", "0"]).horizon, 0)
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            parser.parse_args(["summary", "--horizon", "-3"])
+
+    def test_bulk_arguments(self):
+        # An empty patch and a delete of nothing are refused before any request
+        for argv, message in (
+            (["update", "--from", "2025-03-01"], "--summary"),
+            (["delete"], "event ids"),
+        ):
+            self.requests()
+            with self.assertRaises(SystemExit):
+                self.run_function(*argv)
+            self.assertIn(message, self.output.getvalue())
+            self.assertEqual(self.requests(), 0)
+
+    def test_cassette_skips_journal(self):
+        journal = Journal.load()
+        journal.insert("Work Hours", dict(generate_events(1, end_date=END_DATE)[-1]))
+        output = self.run_command("--replay", "cassette", "flush")
+        self.assertIn("The journal is empty", output)
+        self.assertEqual(len(journal.entries()), 1)
+
+    def test_range_without_load(self):
+        session = Session(self.service, "Work Hours")
+        on_day = session.events_between(END_DATE, END_DATE)
+        self.assertEqual([event.id for event in on_day][-1], "ongoing")
+        self.assertFalse(session.loaded)
+        self.assertFalse(session.has_cache())
+
+    def test_mutations_update_loaded_events(self):
+        session = Session(self.service, "Work Hours")
+        session.load()
+        event = dict(generate_events(1, end_date=END_DATE)[-1], id="new")
+        session.record(
+            self.service.events()
+            .insert(calendarId=session.calendar_id, body=event)
+            .execute()
+        )
+        session.forget("ongoing")
+        self.requests()
+        ids = [event.id for event in session.events_between(END_DATE, END_DATE)]
+        self.assertIn("new", ids)
+        self.assertNotIn("ongoing", ids)
+        self.assertEqual(self.requests(), 0)
+
+        session.close()
+        self.assertIn("new", Session(self.service, "Work Hours")._cache().events)
+
+    def test_ongoing_index(self):
+        session = Session(self.service, "Work Hours")
+        self.assertEqual([e.id for e in session.ongoing_events()], ["ongoing"])
+        session.close()
+
+        # The index only asks for the changes since its last check
+        self.requests()
+        session = Session(self.service, "Work Hours")
+        self.assertEqual([e.id for e in session.ongoing_events()], ["ongoing"])
+        self.assertEqual(dict(self.service.requests), {"events.list": 1})
+        event = self.service.events_by_calendar[session.calendar_id]["ongoing"]
+        session.record(dict(event, end={"dateTime": "2030-01-01T00:00:00Z"}))
+        session.close()
+
+        calendar_id = session.calendar_id
+        open_event = dict(generate_events(1, end_date=END_DATE)[-1], id="other")
+        self.service.store(calendar_id, open_event)
+        session = Session(self.service, "Work Hours")
+        self.assertEqual([e.id for e in session.ongoing_events()], ["other"])
+        session.close()
+
+        self.service.store(calendar_id, {"id": "other", "status": "cancelled"})
+        session = Session(self.service, "Work Hours")
+        self.assertEqual(session.ongoing_events(), [])
+        session.close()
+
+    def test_stale_ongoing_index(self):
+        session = Session(self.service, "Work Hours")
+        session.ongoing_events()
+        session.invalidate_ongoing()
+        session = Session(self.service, "Work Hours")
+        self.assertEqual([e.id for e in session.ongoing_events()], ["ongoing"])
+        self.assertTrue(session.loaded)
+
+    def test_conditional_get(self):
+        session = Session(self.service, "Work Hours")
+        session.load()
+        self.requests()
+        results = session.get_events_by_id(["ongoing", "missing"])
+        self.assertEqual(results["ongoing"], (session.cache.events["ongoing"], None))
+        self.assertEqual(results["missing"][1].resp.status, 404)
+        self.assertEqual(self.service.bytes, 0)
+
+        self.service.events().patch(
+            calendarId=session.calendar_id, eventId="ongoing", body={"summary": "X"}
+        ).execute()
+        event, _ = session.get_events_by_id(["ongoing"])["ongoing"]
+        self.assertEqual(event["summary"], "X")
+        self.assertNotIn("updated", event)
+
+
+if __name__ == "__main__":
+    unittest.main()
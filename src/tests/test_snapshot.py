@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+from unittest import mock
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import generate_events
+from google_calendar import cal, snapshot
+from tests.helpers import CalendarTestCase
+from utils.event import parse_time
+
+
+def contents(service, calendar):
+    calendar_id = cal.get_calendar_id(service, calendar)
+    return sorted(
+        (
+            parse_time(event["start"]),
+            parse_time(event["end"]),
+            "date" in event["start"],
+            event["summary"],
+        )
+        for event in service.events_by_calendar[calendar_id].values()
+    )
+
+
+class TestSnapshot(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.directory, "work.ndjson.gz")
+        self.service = FakeService(
+            {"Work Hours": generate_events(1, seed=1)[:300], "Copy": []}
+        )
+
+    def test_export_import(self):
+        self.assertIn("Exported 300 events", self.run_command("export", self.path))
+        output = self.run_command("-c", "Copy", "import", self.path)
+        self.assertIn("Imported 300 events, 0 were already there", output)
+        self.assertEqual(
+            contents(self.service, "Copy"), contents(self.service, "Work Hours")
+        )
+        self.assertLessEqual(self.service.requests["batch"], 300 // cal.BATCH_SIZE + 1)
+
+        # A second import finds the events there
+        output = self.run_command("-c", "Copy", "import", self.path)
+        self.assertIn("Imported 0 events, 300 were already there", output)
+
+    def test_restore(self):
+        # Imported back, the events keep their id and the deleted ones return
+        before = contents(self.service, "Work Hours")
+        self.run_command("export", self.path)
+        calendar_id = cal.get_calendar_id(self.service, "Work Hours")
+        events = self.service.events_by_calendar[calendar_id]
+        deleted = [*events][:5]
+        for event_id in deleted:
+            self.service.events().delete(
+                calendarId=calendar_id, eventId=event_id
+            ).execute()
+
+        output = self.run_command("import", self.path)
+        self.assertIn("Imported 0 events, 295 were already there", output)
+        self.assertIn("Restored 5 deleted events", output)
+        self.assertEqual(len(events), 300)
+        self.assertEqual(contents(self.service, "Work Hours"), before)
+        self.assertNotIn("cancelled", [events[id].get("status") for id in deleted])
+
+        output = self.run_command("import", self.path)
+        self.assertIn("Imported 0 events, 300 were already there", output)
+        self.assertNotIn("Restored", output)
+
+    def test_resume(self):
+        self.run_command("export", self.path)
+        insert_chunk = snapshot.insert_chunk
+        chunks = []
+
+        def interrupted(*args):
+            if len(chunks) == 2:
+                raise KeyboardInterrupt
+            chunks.append(args)
+            return insert_chunk(*args)
+
+        with mock.patch.object(snapshot, "insert_chunk", interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_command("-c", "Copy", "import", self.path)
+
+        output = self.run_command("-c", "Copy", "import", self.path)
+        self.assertIn("Resuming after 100 of 300 events", output)
+        self.assertIn("Imported 200 events", output)
+        self.assertEqual(
+            contents(self.service, "Copy"), contents(self.service, "Work Hours")
+        )
+
+    def test_csv(self):
+        path = os.path.join(os.path.dirname(self.path), "work.csv")
+        with open(path, "w") as csv_file:
+            csv_file.write(self.run_command("list", "--format", "csv"))
+        self.run_command("-c", "Copy", "import", path)
+        self.assertEqual(
+            contents(self.service, "Copy"), contents(self.service, "Work Hours")
+        )
+
+    def test_without_ids(self):
+        # Hand made files without ids do not share event ids
+        directory = os.path.dirname(self.path)
+        for name, summary in (("a.csv", "FIRST"), ("b.csv", "SECOND")):
+            path = os.path.join(directory, name)
+            with open(path, "w") as csv_file:
+                csv_file.write(
+                    "start,end,summary\n"
+                    "2024-03-01T08:00:00+00:00,2024-03-01T12:00:00+00:00,{}\n".format(
+                        summary
+                    )
+                )
+            output = self.run_command("-c", "Copy", "import", path)
+            self.assertIn("Imported 1 events", output)
+        summaries = [event[3] for event in contents(self.service, "Copy")]
+        self.assertEqual(summaries, ["FIRST", "SECOND"])
+
+    def test_retry_rate_limit(self):
+        refused = HttpError(
+            httplib2.Response({"status": 403}), b'{"reason": "rateLimitExceeded"}'
+        )
+        replies = iter(
+            [
+                {"0": ({"id": "a"}, None), "1": (None, refused)},
+                {"1": ({"id": "b"}, None)},
+            ]
+        )
+        with mock.patch.object(snapshot, "RETRY_DELAY", 0), mock.patch.object(
+            cal, "execute_batch", lambda service, requests: next(replies)
+        ):
+            results = snapshot.insert_chunk(self.service, "copy", [{}, {}])
+        self.assertEqual(results[1], ({"id": "b"}, "inserted"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import os
+import subprocess
+import sys
+import unittest
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["googleapiclient", "google_auth_oauthlib", "google.auth", "yaml"]
+
+
+class TestStartup(unittest.TestCase):
+    def test_no_heavy_imports(self):
+
+        """
+        Test that importing main does not load the Google client or yaml
+        """
+
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, main; print(' '.join(sorted(sys.modules)))",
+            ],
+            cwd=SRC,
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        modules = result.stdout.split()
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
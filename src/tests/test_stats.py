@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+import json
+import unittest
+
+from utils import stats
+from utils.event import from_api_items, iter_api_items
+from benchmarks.synthetic import generate_events
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        stats.reset()
+        self.addCleanup(stats.reset)
+
+    def test_phases_and_counters(self):
+        for _ in range(3):
+            with stats.phase("work"):
+                stats.count("items", 2)
+        data = stats.snapshot()
+        self.assertEqual(data["phases"]["work"]["calls"], 3)
+        self.assertEqual(data["counters"], {"items": 6})
+        self.assertEqual(json.loads(json.dumps(data)), data)
+        self.assertIn("work", stats.format_report(data))
+
+    def test_events_parsed(self):
+        items = generate_events(1)[:10]
+        from_api_items(items)
+        list(iter_api_items(items[:4]))
+        self.assertEqual(stats.snapshot()["counters"]["events parsed"], 14)
+        self.assertIn("parse events", stats.snapshot()["phases"])
+
+
+if __name__ == "__main__":
+    unittest.main()
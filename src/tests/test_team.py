@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+import datetime
+import os
+import unittest
+
+import yaml
+
+from benchmarks.fake_calendar import FakeService
+from benchmarks.synthetic import EXPECTED, generate_events
+from tests.helpers import CalendarTestCase
+
+END_DATE = datetime.date(2024, 5, 20)
+
+PART_TIME = [{"startdate": "2000-01-01", "hours": [4, 4, 4, 4, 4, 0, 0]}]
+
+
+class TestTeam(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = FakeService(
+            {
+                "Alice": generate_events(1, end_date=END_DATE, seed=1),
+                "Bob": generate_events(2, end_date=END_DATE, seed=2),
+            }
+        )
+        with open(os.path.join(self.directory, "bob.yaml"), "w") as bob:
+            yaml.safe_dump({"expected": PART_TIME}, bob)
+        self.team_file = os.path.join(self.directory, "team.yaml")
+        with open(self.team_file, "w") as team:
+            yaml.safe_dump(
+                {
+                    "team": [
+                        {"calendar": "Alice", "expected": EXPECTED},
+                        {"calendar": "Bob", "config": "bob.yaml"},
+                    ]
+                },
+                team,
+            )
+
+    def test_team_report(self):
+        argv = ["-e", END_DATE.isoformat()]
+        report = self.run_function("team", self.team_file, "-j", "2", *argv)
+        report = report.splitlines()
+        self.assertEqual(
+            [line.split()[0] for line in report[1:]], ["Alice", "Bob", "Team"]
+        )
+
+        for line, calendar, expected in (
+            (report[1], "Alice", EXPECTED),
+            (report[2], "Bob", PART_TIME),
+        ):
+            total = self.run_function(
+                "-c", calendar, "summary", *argv, config={"expected": expected}
+            )
+            self.assertEqual(line.split()[-1], total.split()[-1])
+
+    def test_run_without_config(self):
+        output = self.run_command(
+            "team", self.team_file, "-e", END_DATE.isoformat(), config=None
+        )
+        # Only the team report, no day summary of the default calendar
+        self.assertEqual(output.splitlines()[-1].split()[0], "Team")
+
+    def test_unknown_calendar(self):
+        with open(self.team_file, "w") as team:
+            yaml.safe_dump(
+                {"team": [{"calendar": "Alice"}, {"calendar": "Carol"}]}, team
+            )
+        with self.assertRaises(SystemExit):
+            self.run_function("team", self.team_file)
+        self.assertEqual(self.output.getvalue(), "Unknown calendars: Carol\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
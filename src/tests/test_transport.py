@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import json
+import os
+import unittest
+import urllib.parse
+
+import httplib2
+
+from benchmarks.synthetic import generate_events
+from google_calendar import cache, cal
+from google_calendar.transport import RecordingHttp, ReplayHttp
+from tests.helpers import CalendarTestCase
+
+
+class PagedHttp:
+    """Serve the events of one calendar two per page"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(uri).query))
+        offset = int(query.get("pageToken", 0))
+        page = {"items": self.events[offset : offset + 2]}
+        if offset + 2 < len(self.events):
+            page["nextPageToken"] = str(offset + 2)
+        else:
+            page["nextSyncToken"] = "token"
+        response = httplib2.Response({"status": 200, "set-cookie": "secret"})
+        return response, json.dumps(page).encode("utf-8")
+
+
+class TestTransport(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cassette = os.path.join(self.directory, "cassette.json")
+        self.events = generate_events(1)[:5]
+
+    def sync(self, http):
+        events = cal.get_all_events(cal.build_service(http), "work@example.com")
+        os.remove(cache.calendar_cache_path("events", "work@example.com"))
+        return [event["id"] for event in events]
+
+    def test_record_and_replay(self):
+        recorder = RecordingHttp(PagedHttp(self.events), self.cassette)
+        recorded = self.sync(recorder)
+        recorder.save()
+        self.assertEqual(recorder.round_trips, 3)
+        with open(self.cassette, "r") as cassette:
+            self.assertNotIn("secret", cassette.read())
+
+        # The sync asks for the largest pages, the recording had two events
+        replayer = ReplayHttp.load(self.cassette)
+        self.assertEqual(self.sync(replayer), recorded)
+        self.assertEqual(replayer.round_trips, 1)
+
+        replayer = ReplayHttp.load(self.cassette, page_size=1)
+        self.assertEqual(self.sync(replayer), recorded)
+        self.assertEqual(replayer.round_trips, 5)
+
+    def test_replay_batch_ids(self):
+        recorded = "--b\r\nContent-ID: <response-aaa + 1>\r\n\r\n{}"
+        replayer = ReplayHttp(
+            [
+                {
+                    "method": "POST",
+                    "uri": "https://www.googleapis.com/batch/calendar/v3",
+                    "status": 200,
+                    "headers": {},
+                    "content": recorded,
+                }
+            ]
+        )
+        _, content = replayer.request(
+            "https://www.googleapis.com/batch/calendar/v3",
+            method="POST",
+            body="--c\r\nContent-ID: <bbb + 1>\r\n\r\nGET /x",
+        )
+        self.assertIn(b"<response-bbb + 1>", content)
+
+
+if __name__ == "__main__":
+    unittest.main()
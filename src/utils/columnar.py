@@ -0,0 +1,136 @@
+"""Columnar copy of the events for vectorized summaries, needs NumPy
+
+Times are kept as integer microseconds so that sums are exact and match
+the timedelta arithmetic of WorkHours.
+"""
+
+import datetime
+
+import numpy
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Categories of event summaries
+WORK = 0
+DAY_OFF = 1
+IGNORED = 2
+
+
+class EventColumns:
+    """Start and end in microseconds since the epoch, start day ordinal and
+    summary code of each event, summaries holding the text of each code"""
+
+    def __init__(self, start, end, day, summary_code, summaries):
+        self.start = start
+        self.end = end
+        self.day = day
+        self.summary_code = summary_code
+        self.summaries = summaries
+
+    @classmethod
+    def from_events(cls, events):
+        codes = {}
+        start, end, day, summary_code = [], [], [], []
+        for event in events:
+            start.append((event.start - EPOCH) // MICROSECOND)
+            end.append((event.end - EPOCH) // MICROSECOND)
+            day.append(event.start.date().toordinal())
+            summary_code.append(codes.setdefault(event.summary, len(codes)))
+        return cls(
+            numpy.array(start, dtype=numpy.int64),
+            numpy.array(end, dtype=numpy.int64),
+            numpy.array(day, dtype=numpy.int32),
+            numpy.array(summary_code, dtype=numpy.int32),
+            numpy.array([*codes], dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(path) as data:
+            return cls(
+                data["start"],
+                data["end"],
+                data["day"],
+                data["summary_code"],
+                data["summaries"],
+            )
+
+    def save(self, path):
+        numpy.savez(
+            path,
+            start=self.start,
+            end=self.end,
+            day=self.day,
+            summary_code=self.summary_code,
+            summaries=self.summaries,
+        )
+
+    def __len__(self):
+        return len(self.start)
+
+    def first_date(self):
+        if not len(self):
+            return None
+        return datetime.date.fromordinal(int(self.day.min()))
+
+    def categories(self, day_offs, ignored):
+        """Return the category of each event"""
+        by_code = numpy.full(len(self.summaries), WORK, dtype=numpy.int8)
+        by_code[numpy.isin(self.summaries, [*day_offs])] = DAY_OFF
+        by_code[numpy.isin(self.summaries, [*ignored])] = IGNORED
+        return by_code[self.summary_code]
+
+    def worked(self, start_date, planned, day_offs, ignored):
+        """Return the worked microseconds of each day from start_date
+
+        planned holds the planned microseconds of the days, credited for
+        each day off event, as WorkHours.total_worktime does.
+        """
+        days = len(planned)
+        index = self.day.astype(numpy.int64) - start_date.toordinal()
+        in_range = (index >= 0) & (index < days)
+        category = self.categories(day_offs, ignored)
+
+        work = in_range & (category == WORK)
+        worked = numpy.bincount(
+            index[work], weights=self.end[work] - self.start[work], minlength=days
+        ).astype(numpy.int64)
+        day_off = in_range & (category == DAY_OFF)
+        credits = numpy.bincount(index[day_off], minlength=days)
+        return worked + credits * planned
+
+
+def microseconds(timedeltas):
+    return numpy.array([t // MICROSECOND for t in timedeltas], dtype=numpy.int64)
+
+
+def balances(start_date, worked, planned):
+    """Return the daily, cumulative, weekly and monthly balances
+
+    week holds, on each Monday, the balance of the days since the previous
+    Monday or start_date, and month the same on the first of each month.
+    The other days are zero. All in microseconds.
+    """
+    daily = worked - planned
+    dates = numpy.datetime64(start_date, "D") + numpy.arange(len(daily))
+    # 1970-01-01 was a Thursday
+    mondays = (dates.astype(numpy.int64) - 4) % 7 == 0
+    firsts = dates == dates.astype("datetime64[M]").astype("datetime64[D]")
+    return {
+        "daily": daily,
+        "total": numpy.cumsum(daily),
+        "week": _period_sums(daily, mondays),
+        "month": _period_sums(daily, firsts),
+    }
+
+
+def _period_sums(daily, starts):
+    """On each period start, the sum of the days of the period before"""
+    result = numpy.zeros(len(daily), dtype=numpy.int64)
+    if not len(daily):
+        return result
+    period = numpy.cumsum(starts)
+    sums = numpy.bincount(period, weights=daily, minlength=period[-1] + 1)
+    result[starts] = sums[period[starts] - 1].astype(numpy.int64)
+    return result
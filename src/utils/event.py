@@ -0,0 +1,81 @@
+import datetime
+
+from utils import stats
+
+
+def parse_time(entity):
+    """Parse the start or end of an API event into an aware datetime
+
+    All-day events only carry a date, they are placed at midnight UTC so that
+    .date() returns the calendar date.
+    """
+    date_time = entity.get("dateTime")
+    if date_time is None:
+        return datetime.datetime.combine(
+            datetime.date.fromisoformat(entity["date"]),
+            datetime.time(),
+            datetime.timezone.utc,
+        )
+    return datetime.datetime.fromisoformat(date_time.replace("Z", "+00:00"))
+
+
+class Event:
+    """An event parsed once from its API representation"""
+
+    __slots__ = ("id", "summary", "description", "location", "start", "end", "all_day")
+
+    def __init__(
+        self, id, summary, start, end, description="", location="", all_day=False
+    ):
+        self.id = id
+        self.summary = summary
+        self.description = description
+        self.location = location
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+
+    @classmethod
+    def from_api(cls, item):
+        return cls(
+            item.get("id"),
+            item.get("summary", ""),
+            parse_time(item["start"]),
+            parse_time(item["end"]),
+            description=item.get("description", ""),
+            location=item.get("location", ""),
+            all_day="dateTime" not in item["start"],
+        )
+
+    @classmethod
+    def coerce(cls, event):
+        """Return event as an Event, parsing it if it is an API dict"""
+        if isinstance(event, cls):
+            return event
+        return cls.from_api(event)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return "Event({!r}, {!r}, {}, {})".format(
+            self.id, self.summary, self.start.isoformat(), self.end.isoformat()
+        )
+
+
+def from_api_items(items):
+    with stats.phase("parse events"):
+        events = [Event.from_api(item) for item in items]
+    stats.count("events parsed", len(events))
+    return events
+
+
+def iter_api_items(items):
+    parsed = 0
+    try:
+        for item in items:
+            yield Event.from_api(item)
+            parsed += 1
+    finally:
+        stats.count("events parsed", parsed)
@@ -1,13 +1,9 @@
+import collections
 import datetime
 import math
+from string import Template
 
-
-def time_in_range(x, start, end):
-    """Return true if x is in the range [start, end]"""
-    if start <= end:
-        return start <= x <= end
-    else:
-        return start <= x or x <= end
+from utils.event import Event
 
 
 def format_time_diff(diff_seconds, plus_sign="+"):
@@ -32,51 +28,106 @@ def format_time_diff(diff_seconds, plus_sign="+"):
     return "{}{:02d}:{:02d}:{:02d} {}".format(sign_str, hours, minutes, seconds, WARN)
 
 
+class DeltaTemplate(Template):
+    delimiter = "%"
+
+
+def format_timedelta(tdelta, fmt="%H:%M:%S"):
+    d = {"D": tdelta.days}
+    hours, rem = divmod(tdelta.seconds, 3600)
+    minutes, seconds = divmod(rem, 60)
+    d["H"] = "{:02d}".format(hours)
+    d["M"] = "{:02d}".format(minutes)
+    d["S"] = "{:02d}".format(seconds)
+    t = DeltaTemplate(fmt)
+    return t.substitute(**d)
+
+
 def event_duration(event):
-    return datetime.datetime.fromisoformat(
-        event["end"].get("dateTime")
-    ) - datetime.datetime.fromisoformat(event["start"].get("dateTime"))
+    return event.end - event.start
 
 
 def format_event(event):
-    start = get_datetime(event, "start")
-    end = get_datetime(event, "end")
     duration = format_time_diff(event_duration(event).total_seconds(), plus_sign="")
-    description = ""
-    try:
-        description = event["description"]
-    except KeyError:
-        pass
     return "{} {}-{} ({}) {} [{}] : {}".format(
-        start.date(),
-        start.time(),
-        end.time(),
+        event.start.date(),
+        event.start.time(),
+        event.end.time(),
         duration,
-        event["summary"],
-        event["id"],
-        description,
+        event.summary,
+        event.id,
+        event.description,
     )
 
 
-def print_events(events):
+def format_events(events):
     for event in events:
-        print(format_event(event))
+        yield format_event(event)
 
 
-def get_datetime(event, entity):
-    start = datetime.datetime.strptime(
-        event[entity].get("dateTime", event[entity].get("date")), "%Y-%m-%dT%H:%M:%S%z"
-    )
-    return start
+def print_events(events):
+    for line in format_events(events):
+        print(line)
 
 
-def get_events_on_date(all_events, date):
-    events = []
+def index_by_date(all_events):
+    """Bucket events by start date in a single pass, each day in start order"""
+    buckets = collections.defaultdict(list)
     for event in all_events:
-        start = get_datetime(event, "start").date()
-        if start == date:
-            events.append(event)
-    return events
+        buckets[event.start.date()].append(event)
+    for day in buckets.values():
+        day.sort(key=lambda event: event.start)
+    return dict(buckets)
+
+
+def _microseconds(time):
+    return (
+        (time.hour * 60 + time.minute) * 60 + time.second
+    ) * 10**6 + time.microsecond
+
+
+class _Grid:
+    """Bucket layout of a graph row
+
+    Times are kept in half microseconds since midnight so that the bucket
+    centers, half a resolution after each bucket start, are integers.
+    """
+
+    def __init__(self, start, end, resolution):
+        self.start = 2 * _microseconds(start)
+        self.step = 2 * (resolution // datetime.timedelta(microseconds=1))
+        span = 2 * _microseconds(end) - self.start
+        self.size = max(0, -(-span // self.step))
+
+    def first_at_or_after(self, time):
+        """Index of the first bucket center at or after time"""
+        return max(
+            0, -(-(2 * _microseconds(time) - self.start - self.step // 2) // self.step)
+        )
+
+    def last_at_or_before(self, time):
+        """Index of the last bucket center at or before time"""
+        return min(
+            self.size - 1,
+            (2 * _microseconds(time) - self.start - self.step // 2) // self.step,
+        )
+
+    def render(self, events):
+        buckets = [None] * self.size
+        for event in events:
+            first = self.first_at_or_after(event.start.time())
+            last = self.last_at_or_before(event.end.time())
+            if event.start.time() <= event.end.time():
+                spans = ((first, last),)
+            else:
+                # The event wraps past midnight
+                spans = ((first, self.size - 1), (0, last))
+            mark = event.summary[0:1]
+            for span_first, span_last in spans:
+                for i in range(span_first, span_last + 1):
+                    if buckets[i] is None:
+                        buckets[i] = mark
+        return "[]" + "".join(" " if b is None else b for b in buckets) + "[]"
 
 
 def graph(
@@ -85,30 +136,21 @@ def graph(
     end=datetime.time(17, 0, 0),
     resolution=datetime.timedelta(minutes=15),
 ):
+    """Draw the events of a day as one character per resolution bucket
 
-    dt = datetime.datetime(100, 1, 1)
-    range_start = datetime.datetime.combine(dt, start)
-    range_end = datetime.datetime.combine(dt, end)
+    A bucket shows the first letter of the first event covering its center.
+    """
+    events = [Event.coerce(event) for event in events]
+    return _Grid(start, end, resolution).render(events)
 
-    time_histogram = []
 
-    entry = range_start + resolution / 2.0
-    while entry < range_end + resolution / 2.0:
-        time_histogram.append(entry)
-        entry += resolution
-
-    ret_val = "[]"
-    for t in time_histogram:
-        inside = False
-        for event in events:
-            event_start = dt.combine(dt, get_datetime(event, "start").time())
-            event_end = dt.combine(dt, get_datetime(event, "end").time())
-            if time_in_range(t, event_start, event_end):
-                inside = True
-                break
-        if inside:
-            ret_val += event["summary"][0:1]
-        else:
-            ret_val += " "
-
-    return ret_val + "[]"
+def graph_days(
+    events_by_date,
+    dates,
+    start=datetime.time(8, 0, 0),
+    end=datetime.time(17, 0, 0),
+    resolution=datetime.timedelta(minutes=15),
+):
+    """Draw the graph of each of dates from an index_by_date result"""
+    grid = _Grid(start, end, resolution)
+    return [grid.render(events_by_date.get(date, [])) for date in dates]
@@ -0,0 +1,199 @@
+"""Writers of the list and summary reports
+
+Each writer turns the rows of a report into one format and writes them to a
+single stream as they come, without print. TextWriter is the colored
+terminal output, JsonLinesWriter and CsvWriter are meant for other
+programs: durations are in seconds and dates in ISO format.
+"""
+
+import csv
+import datetime
+import json
+import sys
+
+from utils import event_utils
+
+FORMATS = ("text", "jsonl", "csv")
+
+EVENT_FIELDS = (
+    "id",
+    "date",
+    "start",
+    "end",
+    "seconds",
+    "summary",
+    "description",
+    "location",
+    "all_day",
+)
+
+# Rows of a summary: the days, the balance of each week and month before
+# date, and the total
+SUMMARY_FIELDS = ("type", "date", "period", "worked", "planned", "balance", "total")
+
+
+class bcolors:
+    HEADER = "\033[95m"
+    OKBLUE = "\033[94m"
+    OKCYAN = "\033[96m"
+    OKGREEN = "\033[92m"
+    YELLOW = "\033[93m"
+    WEEKEND = "\033[91m"
+    ENDC = "\033[0m"
+    BOLD = "\033[1m"
+    UNDERLINE = "\033[4m"
+
+
+def week_period(date):
+    """Return the ISO week ending the day before date, as 2024-W05"""
+    year, week, _ = (date - datetime.timedelta(days=1)).isocalendar()
+    return "{}-W{:02d}".format(year, week)
+
+
+def month_period(date):
+    return (date - datetime.timedelta(days=1)).strftime("%Y-%m")
+
+
+class TextWriter:
+    """The report for a terminal, with a graph of each day"""
+
+    graph = True
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def event(self, event):
+        self.stream.write(event_utils.format_event(event) + "\n")
+
+    def week(self, date, seconds):
+        self.stream.write(
+            " ** WEEK {} SUMMARY: {}\n".format(
+                (date - datetime.timedelta(days=1)).isocalendar()[1],
+                event_utils.format_time_diff(seconds),
+            )
+        )
+
+    def month(self, date, seconds):
+        self.stream.write(
+            " **** {} SUMMARY: {}\n".format(
+                (date - datetime.timedelta(days=1)).strftime("%B"),
+                event_utils.format_time_diff(seconds),
+            )
+        )
+
+    def day(self, date, worked_seconds, diff_seconds, graph, total_seconds):
+        color = ""
+        if date.weekday() == 5 or date.weekday() == 6:
+            color = bcolors.WEEKEND
+        self.stream.write(
+            "{} {} {} {} {} {} {}\n".format(
+                color,
+                date,
+                event_utils.format_timedelta(
+                    datetime.timedelta(seconds=worked_seconds)
+                ),
+                event_utils.format_time_diff(diff_seconds),
+                graph,
+                bcolors.ENDC,
+                event_utils.format_time_diff(total_seconds),
+            )
+        )
+
+    def total(self, seconds):
+        self.stream.write("Total: " + event_utils.format_time_diff(seconds) + "\n")
+
+    def close(self):
+        self.stream.flush()
+
+
+class RowWriter:
+    """Base of the writers of one record per row"""
+
+    graph = False
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def event(self, event):
+        self.row(
+            {
+                "id": event.id,
+                "date": event.start.date().isoformat(),
+                "start": event.start.isoformat(),
+                "end": event.end.isoformat(),
+                "seconds": event_utils.event_duration(event).total_seconds(),
+                "summary": event.summary,
+                "description": event.description,
+                "location": event.location,
+                "all_day": event.all_day,
+            }
+        )
+
+    def week(self, date, seconds):
+        self.row(
+            {
+                "type": "week",
+                "date": date.isoformat(),
+                "period": week_period(date),
+                "balance": seconds,
+            }
+        )
+
+    def month(self, date, seconds):
+        self.row(
+            {
+                "type": "month",
+                "date": date.isoformat(),
+                "period": month_period(date),
+                "balance": seconds,
+            }
+        )
+
+    def day(self, date, worked_seconds, diff_seconds, graph, total_seconds):
+        self.row(
+            {
+                "type": "day",
+                "date": date.isoformat(),
+                "worked": worked_seconds,
+                "planned": worked_seconds - diff_seconds,
+                "balance": diff_seconds,
+                "total": total_seconds,
+            }
+        )
+
+    def total(self, seconds):
+        self.row({"type": "total", "balance": seconds})
+
+    def close(self):
+        self.stream.flush()
+
+
+class JsonLinesWriter(RowWriter):
+    def row(self, row):
+        self.stream.write(json.dumps(row) + "\n")
+
+
+class CsvWriter(RowWriter):
+    """Write the rows under a header of fields"""
+
+    def __init__(self, stream, fields):
+        super().__init__(stream)
+        self.writer = csv.DictWriter(stream, fields, lineterminator="\n")
+        self.writer.writeheader()
+
+    def row(self, row):
+        self.writer.writerow(row)
+
+
+def writer(output_format, fields, stream=None):
+    """Return the writer of output_format, to stdout by default
+
+    fields are the CSV columns of the report.
+    """
+    if stream is None:
+        stream = sys.stdout
+    if output_format == "jsonl":
+        return JsonLinesWriter(stream)
+    if output_format == "csv":
+        return CsvWriter(stream, fields)
+    return TextWriter(stream)
@@ -0,0 +1,83 @@
+import datetime
+
+DEFAULT_HORIZON = 60
+
+
+class Rollups:
+    """Worked and planned seconds per day of a calendar
+
+    Days up to closed_until are closed: their balance is summed into
+    closed_balance and they are only recomputed when one of their events
+    changes. The whole store is rebuilt when the fingerprint of the rules it
+    was computed with or the first day does not match. dirty tells whether
+    it changed since it was loaded.
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.fingerprint = data.get("fingerprint")
+        self.first_date = _date(data.get("firstDate"))
+        self.closed_until = _date(data.get("closedUntil"))
+        self.closed_balance = data.get("closedBalance", 0.0)
+        self.days = {
+            datetime.date.fromisoformat(date): tuple(seconds)
+            for date, seconds in data.get("days", {}).items()
+        }
+        self.dirty = False
+
+    def to_json(self):
+        return {
+            "fingerprint": self.fingerprint,
+            "firstDate": _isoformat(self.first_date),
+            "closedUntil": _isoformat(self.closed_until),
+            "closedBalance": self.closed_balance,
+            "days": {
+                date.isoformat(): list(seconds) for date, seconds in self.days.items()
+            },
+        }
+
+    def matches(self, fingerprint, first_date):
+        return self.fingerprint == fingerprint and self.first_date == first_date
+
+    def reset(self, fingerprint, first_date):
+        self.__init__({"fingerprint": fingerprint})
+        self.first_date = first_date
+        self.dirty = True
+
+    def open_dates(self, until):
+        """Return the dates after the checkpoint up to until"""
+        date = self.first_date
+        if self.closed_until is not None:
+            date = self.closed_until + datetime.timedelta(days=1)
+        dates = []
+        while date <= until:
+            dates.append(date)
+            date += datetime.timedelta(days=1)
+        return dates
+
+    def set_day(self, date, worked, planned):
+        old = self.days.get(date)
+        if old == (worked, planned):
+            return
+        self.days[date] = (worked, planned)
+        self.dirty = True
+        if self.closed_until is not None and date <= self.closed_until:
+            if old is not None:
+                self.closed_balance -= old[0] - old[1]
+            self.closed_balance += worked - planned
+
+    def close(self, until):
+        """Move the checkpoint forward to until, the days must be set"""
+        for date in self.open_dates(until):
+            worked, planned = self.days[date]
+            self.closed_balance += worked - planned
+            self.closed_until = date
+            self.dirty = True
+
+
+def _date(value):
+    return None if value is None else datetime.date.fromisoformat(value)
+
+
+def _isoformat(date):
+    return None if date is None else date.isoformat()
@@ -0,0 +1,68 @@
+import bisect
+import datetime
+
+DEFAULT_PLANNED = datetime.timedelta(hours=7, minutes=12)
+
+
+class Schedule:
+    """Expected work hours compiled from the "expected" configuration
+
+    Each entry applies to the days after its startdate until the day after
+    the next startdate, regardless of the order of the entries in the file.
+    Days before the first entry get DEFAULT_PLANNED.
+    """
+
+    def __init__(self, expected, default=DEFAULT_PLANNED):
+        entries = []
+        for entry in expected:
+            try:
+                startdate = datetime.date.fromisoformat(str(entry["startdate"]))
+            except (KeyError, ValueError):
+                raise ValueError(
+                    "Invalid startdate in expected hours: {!r}".format(entry)
+                )
+            hours = entry.get("hours") or []
+            if len(hours) != 7 or not all(
+                isinstance(h, (int, float)) and h >= 0 for h in hours
+            ):
+                raise ValueError(
+                    "Expected seven non-negative hours for {}: {!r}".format(
+                        startdate, hours
+                    )
+                )
+            entries.append(
+                (startdate, tuple(datetime.timedelta(hours=h) for h in hours))
+            )
+        entries.sort(key=lambda entry: entry[0])
+        self._dates = [startdate for startdate, _ in entries]
+        for previous, current in zip(self._dates, self._dates[1:]):
+            if previous == current:
+                raise ValueError(
+                    "Duplicate startdate in expected hours: {}".format(current)
+                )
+        self._weeks = [week for _, week in entries]
+        self._default = default
+        self._memo = {}
+
+    def planned(self, date):
+        try:
+            return self._memo[date]
+        except KeyError:
+            pass
+        i = bisect.bisect_left(self._dates, date)
+        planned = self._weeks[i - 1][date.weekday()] if i else self._default
+        self._memo[date] = planned
+        return planned
+
+    def planned_range(self, start_date, end_date):
+        """Return the planned time of each day from start_date to end_date"""
+        planned = []
+        i = bisect.bisect_left(self._dates, start_date)
+        date = start_date
+        day = datetime.timedelta(days=1)
+        while date <= end_date:
+            while i < len(self._dates) and self._dates[i] < date:
+                i += 1
+            planned.append(self._weeks[i - 1][date.weekday()] if i else self._default)
+            date += day
+        return planned
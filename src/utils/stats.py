@@ -0,0 +1,68 @@
+"""Phase timers and counters of one wlog invocation
+
+Phases add up the wall clock time spent in them, across threads, and the
+number of times they were entered. Counters add up API requests, pages,
+bytes and parsed events. Both are cheap enough to be always on.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+_lock = threading.Lock()
+_seconds = collections.Counter()
+_calls = collections.Counter()
+_counters = collections.Counter()
+
+
+def reset():
+    with _lock:
+        _seconds.clear()
+        _calls.clear()
+        _counters.clear()
+
+
+@contextlib.contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        with _lock:
+            _seconds[name] += seconds
+            _calls[name] += 1
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def snapshot():
+    """Return the phases and counters as a JSON serializable dict"""
+    with _lock:
+        return {
+            "phases": {
+                name: {"seconds": round(_seconds[name], 6), "calls": _calls[name]}
+                for name in _seconds
+            },
+            "counters": dict(_counters),
+        }
+
+
+def format_report(data=None):
+    """Return the phases, slowest first, and the counters as text lines"""
+    data = data or snapshot()
+    lines = ["{:<24} {:>10} {:>7}".format("phase", "seconds", "calls")]
+    phases = sorted(data["phases"].items(), key=lambda item: -item[1]["seconds"])
+    for name, result in phases:
+        lines.append(
+            "{:<24} {:>10.4f} {:>7}".format(name, result["seconds"], result["calls"])
+        )
+    lines.append("")
+    lines.append("{:<24} {:>10}".format("counter", "value"))
+    for name, value in sorted(data["counters"].items()):
+        lines.append("{:<24} {:>10}".format(name, value))
+    return "\n".join(lines)